@@ -1,13 +1,5 @@
-from .pdf_processor import (
-    process_factura_venta,
-    process_factura_compra,
-    process_facturas_compras_nuevos,
-    process_facturas_gastos,
-    process_nota_credito,
-    process_nota_debito,
-    process_inventory
-)
-
+# Los procesadores de PDF se importan bajo demanda para que los módulos de
+# descarga (por ejemplo `python -m core.download`) no carguen pdfplumber ni PyQt5.
 __all__ = [
     'process_factura_venta',
     'process_factura_compra',
@@ -16,4 +8,11 @@ __all__ = [
     'process_nota_credito',
     'process_nota_debito',
     'process_inventory'
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import pdf_processor
+        return getattr(pdf_processor, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
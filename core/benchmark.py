@@ -0,0 +1,135 @@
+"""Mide el rendimiento del descargador contra el portal DIAN simulado.
+
+Levanta core.mock_portal en un puerto local, ejecuta DownloadEngine contra él
+en una carpeta temporal y reporta CUFEs por minuto, fallas y los límites
+finales del control de tasa. Sirve para comparar cambios de concurrencia o de
+esperas sin tocar el portal real.
+
+Uso:
+    python -m core.benchmark --cufes 20 --workers 2 --latency 0.5 --error-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+from core.mock_portal import (MockPortal, DEFAULT_PDF_DIR, index_pdfs, config_from_args,
+                              build_parser as portal_parser)
+
+
+def benchmark_cufes(count, pdf_dir=DEFAULT_PDF_DIR):
+    """CUFEs de prueba: primero los de los PDFs de la carpeta, luego sintéticos"""
+    by_cufe, _ = index_pdfs(pdf_dir)
+    cufes = sorted(by_cufe)[:count]
+    i = 0
+    while len(cufes) < count:
+        cufes.append(hashlib.sha384(f"benchmark-{i}".encode()).hexdigest())
+        i += 1
+    return cufes
+
+
+def run_benchmark(cufes, config=None, workers=1, fetch_concurrency=None, keep_output=None,
+                  host="127.0.0.1", port=0, isolate_browsers=False, http_search=False,
+                  reuse_page=False, lightweight_browser=False):
+    """Ejecuta una corrida completa contra el portal simulado y retorna el resumen"""
+    from core.download_engine import DownloadEngine
+    from core.pdf_fetcher import DEFAULT_FETCH_CONCURRENCY
+
+    portal = MockPortal(config, host, port).start()
+    folder_path = keep_output or tempfile.mkdtemp(prefix="dian_benchmark_")
+    os.makedirs(folder_path, exist_ok=True)
+    excel_path = os.path.join(folder_path, "benchmark.xlsx")
+    try:
+        engine = DownloadEngine(
+            cufes,
+            folder_path,
+            excel_path,
+            workers=workers,
+            resume=False,
+            use_token_cache=False,
+            fetch_concurrency=fetch_concurrency or DEFAULT_FETCH_CONCURRENCY,
+            portal_url=portal.url,
+            isolate_browsers=isolate_browsers,
+            http_search=http_search,
+            reuse_page=reuse_page,
+            lightweight_browser=lightweight_browser
+        )
+        start = time.monotonic()
+        result = engine.run()
+        elapsed = time.monotonic() - start
+    finally:
+        portal.stop()
+        if keep_output is None:
+            shutil.rmtree(folder_path, ignore_errors=True)
+
+    downloaded = result['completed'] - len(result['failed'])
+    return {
+        'cufes': len(cufes),
+        'workers': engine.workers,
+        'fetch_concurrency': engine.fetcher.concurrency if engine.fetcher else None,
+        'elapsed_seconds': round(elapsed, 1),
+        'downloaded': downloaded,
+        'failed': len(result['failed']),
+        'cufes_per_minute': round(downloaded * 60.0 / elapsed, 2) if elapsed else 0.0,
+        'limits': result.get('limits'),
+        'latency': result.get('latency'),
+        'portal': dict(portal.stats)
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m core.benchmark',
+        description='Mide CUFEs por minuto del descargador contra el portal simulado',
+        parents=[portal_parser()],
+        conflict_handler='resolve'
+    )
+    parser.set_defaults(port=0)
+    parser.add_argument('--cufes', type=int, default=10, help='Cantidad de CUFEs a procesar')
+    parser.add_argument('--workers', type=int, default=1, help='Sesiones de navegador')
+    parser.add_argument('--fetch-concurrency', type=int, default=None,
+                        help='Descargas HTTP simultáneas')
+    parser.add_argument('--isolate-browsers', action='store_true',
+                        help='Navegadores en procesos aparte')
+    parser.add_argument('--http-search', action='store_true',
+                        help='Búsquedas por HTTP tras resolver el CAPTCHA')
+    parser.add_argument('--reuse-page', action='store_true',
+                        help='Reutilizar la página de búsqueda entre CUFEs')
+    parser.add_argument('--lightweight-browser', action='store_true',
+                        help='Perfil liviano de Chrome con bloqueo de recursos')
+    parser.add_argument('--keep-output', help='Conservar los PDFs descargados en esta carpeta')
+    parser.add_argument('--summary', help='Guardar el resumen JSON en este archivo')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s: %(message)s',
+                        stream=sys.stderr)
+    summary = run_benchmark(
+        benchmark_cufes(args.cufes, args.pdf_dir),
+        config_from_args(args),
+        workers=args.workers,
+        fetch_concurrency=args.fetch_concurrency,
+        keep_output=args.keep_output,
+        host=args.host,
+        port=args.port,
+        isolate_browsers=args.isolate_browsers,
+        http_search=args.http_search,
+        reuse_page=args.reuse_page,
+        lightweight_browser=args.lightweight_browser
+    )
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(text)
+    print(text)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import logging
+from contextlib import nullcontext
+from core.waits import wait_until, captcha_shown, captcha_solved, token_in_url, WaitTimeout
+from core.cancellation import Cancelled
+from core.pdf_fetcher import PORTAL_URL
+
+# URLs y selectores del portal DIAN
+SEARCH_PATH = "/User/SearchDocument"
+SEARCH_URL = PORTAL_URL + SEARCH_PATH
+CUFE_INPUT = "input[placeholder='Ingrese el código CUFE o UUID']"
+SEARCH_BUTTON = "button:contains('Buscar')"
+
+
+def on_search_page(sb, search_url):
+    """Verdadero si el navegador ya está en la página de búsqueda con el campo CUFE"""
+    try:
+        current = sb.get_current_url().split("?", 1)[0].rstrip("/")
+        return current == search_url.rstrip("/") and sb.is_element_visible(CUFE_INPUT)
+    except Exception:
+        return False
+
+
+def capture_token(sb, cufe, search_url=SEARCH_URL, metrics=None, reuse_page=False,
+                  cancel=None):
+    """Resuelve el CAPTCHA, busca el CUFE y retorna la URL de resultado.
+
+    El CAPTCHA se resuelve solo si la página muestra el widget sin respuesta;
+    si el portal lo pide al buscar, se resuelve y se busca de nuevo. Con
+    reuse_page no reabre la página de búsqueda si el navegador ya está en
+    ella y al terminar vuelve atrás para dejar la página lista para el
+    siguiente CUFE.
+    Si se entrega metrics (StageMetrics), registra la duración de cada etapa.
+    Con cancel (CancelToken) lanza Cancelled entre etapas y dentro de las esperas.
+    """
+    def stage(name):
+        if cancel is not None:
+            cancel.check()
+        return metrics.stage(cufe, name) if metrics else nullcontext({})
+
+    if not (reuse_page and on_search_page(sb, search_url)):
+        with stage('open'):
+            sb.uc_open_with_reconnect(search_url, 4)
+            wait_until(lambda: sb.is_element_visible(CUFE_INPUT), 'open', cancel=cancel)
+
+    # Sin el widget (autorización vigente o página reutilizada ya resuelta) se
+    # busca directamente
+    solve_captcha = captcha_shown(sb) and not captcha_solved(sb)
+    while True:
+        if solve_captcha:
+            logging.info("Resolviendo CAPTCHA...")
+            with stage('captcha'):
+                sb.uc_gui_click_captcha()
+                wait_until(lambda: captcha_solved(sb), 'captcha', cancel=cancel)
+
+        with stage('type'):
+            sb.type(CUFE_INPUT, cufe)
+            wait_until(lambda: sb.get_value(CUFE_INPUT) == cufe, 'type', cancel=cancel)
+
+        with stage('search') as timing:
+            sb.click(SEARCH_BUTTON)
+            try:
+                wait_until(lambda: token_in_url(sb.get_current_url()), 'search', cancel=cancel)
+            except WaitTimeout as e:
+                timing['outcome'] = type(e).__name__
+                logging.warning(str(e))
+
+        current_url = sb.get_current_url()
+        if solve_captcha or token_in_url(current_url) or not on_search_page(sb, search_url):
+            break
+        # La página no mostraba el CAPTCHA pero el portal lo pidió
+        logging.info("El portal volvió a pedir CAPTCHA")
+        solve_captcha = True
+
+    logging.info(f"URL capturada: {current_url}")
+
+    if reuse_page and token_in_url(current_url):
+        try:
+            with stage('back'):
+                sb.go_back()
+                wait_until(lambda: on_search_page(sb, search_url), 'back', cancel=cancel)
+        except Cancelled:
+            raise
+        except Exception as e:
+            # El siguiente CUFE abre la página desde cero
+            logging.info(f"No se pudo volver a la página de búsqueda: {str(e)}")
+    return current_url
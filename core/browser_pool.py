@@ -0,0 +1,322 @@
+import logging
+import threading
+from contextlib import contextmanager
+from seleniumbase import SB
+from core.process_worker import CaptureProcess
+from core.http_search import SearchHandoff
+
+# Documentos que procesa un navegador antes de reciclarlo
+DEFAULT_MAX_DOCUMENTS = 200
+# Memoria (MB) a partir de la cual se recicla un navegador: proceso completo
+# de Chrome si psutil está instalado, si no solo el heap de JavaScript
+DEFAULT_MEMORY_LIMIT_MB = 1500
+JS_HEAP_LIMIT_MB = 512
+# Fallas seguidas al lanzar navegadores antes de dar el pool por caído
+MAX_LAUNCH_FAILURES = 3
+
+
+# Opciones de SeleniumBase comunes a todas las sesiones
+BROWSER_OPTIONS = {'uc': True, 'test': True, 'incognito': True, 'locale_code': "en"}
+
+# Perfil liviano: sin imágenes, sin esperar subrecursos y sin servicios de
+# fondo de Chrome que no se usan para buscar un CUFE
+LIGHTWEIGHT_ARGS = (
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-domain-reliability",
+    "--disable-sync",
+    "--disable-notifications",
+    "--no-pings",
+    "--mute-audio",
+    "--disk-cache-size=33554432"
+)
+LIGHTWEIGHT_OPTIONS = {
+    'block_images': True,
+    'page_load_strategy': "eager",
+    'chromium_arg': ",".join(LIGHTWEIGHT_ARGS)
+}
+
+# Recursos que el perfil liviano no descarga. Las hojas de estilo se conservan
+# porque uc_gui_click_captcha hace clic por coordenadas en pantalla.
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*"
+]
+
+
+def default_browser():
+    """Context manager de una sesión SeleniumBase con Chrome no detectable"""
+    return SB(**BROWSER_OPTIONS)
+
+
+def block_resources(sb, urls=BLOCKED_URLS):
+    """Bloquea por CDP las URLs indicadas en la pestaña actual"""
+    try:
+        sb.driver.execute_cdp_cmd("Network.enable", {})
+        sb.driver.execute_cdp_cmd("Network.setBlockedURLs", {'urls': list(urls)})
+    except Exception as e:
+        logging.debug(f"No se pudo activar el bloqueo de recursos: {str(e)}")
+
+
+class LightweightBrowser:
+    """Sesión de SeleniumBase que reactiva el bloqueo de recursos antes de cada apertura.
+
+    uc_open_with_reconnect desconecta el driver mientras carga la página, por
+    eso el bloqueo se vuelve a aplicar en cada navegación.
+    """
+
+    def __init__(self, sb):
+        self._sb = sb
+
+    def __getattr__(self, name):
+        return getattr(self._sb, name)
+
+    def uc_open_with_reconnect(self, url, reconnect_time=None):
+        block_resources(self._sb)
+        return self._sb.uc_open_with_reconnect(url, reconnect_time)
+
+
+@contextmanager
+def lightweight_browser():
+    """Context manager de una sesión con el perfil liviano y bloqueo de recursos"""
+    with SB(**BROWSER_OPTIONS, **LIGHTWEIGHT_OPTIONS) as sb:
+        yield LightweightBrowser(sb)
+
+
+def browser_factory(lightweight=False):
+    """Fábrica de sesiones para el pool según el perfil elegido"""
+    return lightweight_browser if lightweight else default_browser
+
+
+class BrowserSession:
+    """Sesión de navegador abierta fuera de un bloque with.
+
+    Entra al context manager de SeleniumBase al crearse y sale en close(),
+    así el pool la puede mantener viva entre CUFEs y entre hilos.
+    """
+
+    def __init__(self, session_id, factory=default_browser):
+        self.id = session_id
+        self.documents = 0
+        self._context = factory()
+        self.sb = self._context.__enter__()
+        self.search = SearchHandoff(self.sb)
+
+    def capture(self, cufe, search_url, metrics=None, http_search=False, reuse_page=False,
+                cancel=None):
+        """Captura el token del CUFE con este navegador y retorna la URL"""
+        return self.search.capture(cufe, search_url, metrics, http_search, reuse_page, cancel)
+
+    def alive(self):
+        """Verdadero si el navegador todavía responde"""
+        try:
+            return self.sb.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def memory_mb(self):
+        """Memoria del proceso de Chrome en MB; None sin psutil o si no se puede medir"""
+        try:
+            import psutil
+        except ImportError:
+            return None
+        try:
+            process = psutil.Process(self.sb.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def heap_mb(self):
+        """Heap de JavaScript de la página actual en MB, o None"""
+        try:
+            heap = self.sb.execute_script(
+                "return window.performance && performance.memory ? "
+                "performance.memory.usedJSHeapSize : null;")
+            return heap / (1024 * 1024) if heap else None
+        except Exception:
+            return None
+
+    def close(self):
+        self.search.drop_client()
+        try:
+            self._context.__exit__(None, None, None)
+        except Exception as e:
+            logging.warning(f"Error cerrando el navegador {self.id}: {str(e)}")
+
+
+class BrowserPool:
+    """Pool de navegadores precalentados para la captura de tokens.
+
+    start() lanza las sesiones en segundo plano (por ejemplo mientras se lee
+    el Excel); si no se llama, se lanzan al primer acquire(). Al devolver una
+    sesión con release() se verifica que responda y se recicla si superó
+    max_documents o el límite de memoria; las sesiones caídas o recicladas se
+    reemplazan en segundo plano sin detener la cola. Con isolate=True cada
+    sesión es un proceso hijo (CaptureProcess) vigilado por latidos. Con cancel
+    (CancelToken) activado, o después de close(), no se lanzan reemplazos.
+    """
+
+    def __init__(self, size=1, factory=default_browser, max_documents=DEFAULT_MAX_DOCUMENTS,
+                 memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, isolate=False, cancel=None):
+        self.size = max(1, int(size))
+        self.factory = factory
+        self.isolate = isolate
+        self.cancel = cancel
+        self.max_documents = max_documents
+        self.memory_limit_mb = memory_limit_mb
+        self.recycled = 0
+        self._idle = []
+        self._busy = set()
+        self._launching = 0
+        self._failures = 0
+        self._next_id = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Lanza en segundo plano las sesiones que falten para llegar a size"""
+        with self._cond:
+            self._fill()
+        return self
+
+    def resize(self, size):
+        with self._cond:
+            self.size = max(1, int(size))
+            self._fill()
+
+    @property
+    def broken(self):
+        """Verdadero si los navegadores no se pueden lanzar"""
+        with self._cond:
+            return self._is_broken()
+
+    def _is_broken(self):
+        return (self._failures >= MAX_LAUNCH_FAILURES and not self._launching
+                and not self._idle and not self._busy)
+
+    def _alive_count(self):
+        return len(self._idle) + len(self._busy) + self._launching
+
+    def _stopping(self):
+        return self._closed or (self.cancel is not None and self.cancel.cancelled)
+
+    def _fill(self):
+        # Se llama con el lock tomado
+        while (not self._stopping() and self._failures < MAX_LAUNCH_FAILURES
+               and self._alive_count() < self.size):
+            self._launching += 1
+            self._next_id += 1
+            threading.Thread(target=self._launch, args=(self._next_id,),
+                             name=f"dian-browser-{self._next_id}", daemon=True).start()
+
+    def _launch(self, session_id):
+        try:
+            if self.isolate:
+                session = CaptureProcess(session_id, self.factory)
+            else:
+                session = BrowserSession(session_id, self.factory)
+        except Exception as e:
+            logging.error(f"No se pudo iniciar el navegador {session_id}: {str(e)}")
+            with self._cond:
+                self._launching -= 1
+                self._failures += 1
+                self._fill()
+                self._cond.notify_all()
+            return
+
+        logging.info(f"Navegador {session_id} listo")
+        with self._cond:
+            self._launching -= 1
+            self._failures = 0
+            keep = not self._stopping() and self._alive_count() < self.size
+            if keep:
+                self._idle.append(session)
+            self._cond.notify_all()
+        if not keep:
+            session.close()
+
+    def acquire(self, should_continue=None, poll=0.5):
+        """Espera una sesión lista; retorna None si el pool se cerró o cayó,
+        o si should_continue() deja de ser verdadero"""
+        with self._cond:
+            while True:
+                if self._closed or self._is_broken():
+                    return None
+                if should_continue is not None and not should_continue():
+                    return None
+                if self._idle:
+                    session = self._idle.pop()
+                    self._busy.add(session)
+                    return session
+                self._fill()
+                self._cond.wait(poll)
+
+    def release(self, session):
+        """Devuelve la sesión al pool o la recicla si no está sana"""
+        session.documents += 1
+        reason = None
+        if self._stopping():
+            # Al cancelar, las sesiones terminadas por el watchdog no se reciclan
+            with self._cond:
+                self._busy.discard(session)
+                keep = not self._closed and session.alive()
+                if keep:
+                    self._idle.append(session)
+                self._cond.notify_all()
+            if not keep:
+                threading.Thread(target=session.close, daemon=True).start()
+            return
+        if not session.alive():
+            reason = "no responde"
+        elif self.max_documents and session.documents >= self.max_documents:
+            reason = f"{session.documents} documentos procesados"
+        elif self.memory_limit_mb:
+            memory = session.memory_mb()
+            if memory is not None and memory > self.memory_limit_mb:
+                reason = f"usa {memory:.0f} MB"
+            elif memory is None:
+                heap = session.heap_mb()
+                if heap is not None and heap > JS_HEAP_LIMIT_MB:
+                    reason = f"heap de JavaScript de {heap:.0f} MB"
+
+        with self._cond:
+            self._busy.discard(session)
+            surplus = self._closed or self._alive_count() >= self.size
+            keep = reason is None and not surplus
+            if keep:
+                self._idle.append(session)
+            elif reason is not None:
+                self.recycled += 1
+                self._fill()
+            self._cond.notify_all()
+
+        if reason is not None:
+            logging.info(f"Reciclando navegador {session.id}: {reason}")
+        if not keep:
+            threading.Thread(target=session.close, daemon=True).start()
+
+    def close(self):
+        """Cierra las sesiones libres; las ocupadas se cierran al devolverlas"""
+        with self._cond:
+            self._closed = True
+            sessions = list(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+        for session in sessions:
+            session.close()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'isolate': self.isolate,
+                'idle': len(self._idle),
+                'busy': len(self._busy),
+                'launching': self._launching,
+                'recycled': self.recycled
+            }
@@ -0,0 +1,65 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class Cancelled(Exception):
+    """La descarga se detuvo a pedido del usuario"""
+
+
+class CancelToken:
+    """Señal de cancelación compartida entre los hilos de una descarga.
+
+    Las esperas la consultan en cada sondeo y las operaciones bloqueantes
+    (respuestas HTTP en curso) registran con on_cancel() un callback que las
+    interrumpe, así detener no espera a que termine el CUFE en curso.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.debug(f"Error interrumpiendo una operación cancelada: {str(e)}")
+
+    def check(self):
+        """Lanza Cancelled si ya se pidió detener"""
+        if self._event.is_set():
+            raise Cancelled("Proceso detenido por el usuario")
+
+    def wait(self, timeout):
+        """Duerme hasta timeout segundos; retorna True si se canceló antes"""
+        return self._event.wait(timeout)
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """Llama a callback si se cancela mientras dura el bloque.
+
+        Los errores que provoca la interrupción se convierten en Cancelled.
+        """
+        with self._lock:
+            self.check()
+            self._callbacks.append(callback)
+        try:
+            yield self
+        except Exception as e:
+            if self._event.is_set():
+                raise Cancelled("Proceso detenido por el usuario") from e
+            raise
+        finally:
+            with self._lock:
+                self._callbacks.remove(callback)
@@ -0,0 +1,104 @@
+import os
+import re
+import logging
+
+TOKEN_SHEET = "Token"
+CUFE_COLUMN = "CUFE/CUDE"
+
+# CUFE y CUDE son SHA-384 en hexadecimal: 96 caracteres
+CUFE_PATTERN = re.compile(r"^[0-9a-f]{96}$")
+WHITESPACE = re.compile(r"\s+")
+
+# Filas inválidas que se muestran en el log antes de resumir
+MAX_REPORTED_ROWS = 20
+
+
+class CufeBatch:
+    """CUFEs válidos y únicos de un Excel, con las filas descartadas"""
+
+    def __init__(self):
+        self.cufes = []
+        self.invalid = []
+        self.duplicates = []
+        self.blank = 0
+
+    @property
+    def rows(self):
+        return len(self.cufes) + len(self.invalid) + len(self.duplicates) + self.blank
+
+    def describe(self):
+        """Resumen en texto para el log"""
+        lines = [f"{self.rows} filas leídas: {len(self.cufes)} CUFEs válidos, "
+                 f"{len(self.invalid)} inválidos, {len(self.duplicates)} duplicados"]
+        for row, value in self.invalid[:MAX_REPORTED_ROWS]:
+            lines.append(f"Fila {row}: CUFE inválido '{value}'")
+        if len(self.invalid) > MAX_REPORTED_ROWS:
+            lines.append(f"... y {len(self.invalid) - MAX_REPORTED_ROWS} filas inválidas más")
+        return lines
+
+
+def normalize_cufe(value):
+    """Quita espacios internos y externos y pasa el CUFE a minúsculas"""
+    return WHITESPACE.sub("", str(value)).lower()
+
+
+def validate_cufes(values, first_row=2):
+    """Normaliza, valida y deduplica los valores de la columna CUFE/CUDE.
+
+    first_row es el número de fila de Excel del primer valor, para que el
+    reporte de filas inválidas coincida con lo que ve el usuario.
+    """
+    batch = CufeBatch()
+    seen = set()
+    for row, value in enumerate(values, start=first_row):
+        if value is None or (isinstance(value, float) and value != value):
+            batch.blank += 1
+            continue
+        cufe = normalize_cufe(value)
+        if not cufe:
+            batch.blank += 1
+        elif not CUFE_PATTERN.match(cufe):
+            batch.invalid.append((row, str(value).strip()))
+        elif cufe in seen:
+            batch.duplicates.append((row, cufe))
+        else:
+            seen.add(cufe)
+            batch.cufes.append(cufe)
+    return batch
+
+
+def _iter_xlsx_column(excel_path, sheet_name, column):
+    """Recorre solo la columna pedida de un .xlsx en modo de solo lectura"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"El archivo no tiene la hoja '{sheet_name}'")
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        headers = [str(cell).strip() if cell is not None else "" for cell in header]
+        if column not in headers:
+            raise ValueError(f"La hoja '{sheet_name}' no tiene la columna '{column}'")
+        index = headers.index(column)
+        for row in rows:
+            yield row[index] if index < len(row) else None
+    finally:
+        workbook.close()
+
+
+def read_cufes(excel_path, sheet_name=TOKEN_SHEET, column=CUFE_COLUMN):
+    """Lee y valida la columna CUFE/CUDE de la hoja Token; retorna un CufeBatch"""
+    if os.path.splitext(excel_path)[1].lower() in (".xlsx", ".xlsm"):
+        values = _iter_xlsx_column(excel_path, sheet_name, column)
+    else:
+        import pandas as pd
+
+        df = pd.read_excel(excel_path, sheet_name=sheet_name, usecols=[column], dtype=str)
+        values = df[column].tolist()
+    batch = validate_cufes(values)
+    summary, *details = batch.describe()
+    logging.info(summary)
+    for line in details:
+        logging.warning(line)
+    return batch
@@ -9,7 +9,12 @@ import os
 import logging
 import time
 import requests
-from pdf_processor import process_downloaded_pdfs
+from core.waits import wait_until, captcha_shown, captcha_solved, token_in_url, WaitTimeout
+from core.manifest import DownloadManifest
+from core.token_cache import get_token_cache, parse_token
+from core.pdf_fetcher import save_pdf_stream, PdfIntegrityError, DOWNLOAD_TIMEOUT
+from core.log_pipeline import start_queue_logging
+from ui.log_viewer import LogViewer, LogViewerHandler
 
 class ConfigDialog(QDialog):
     def __init__(self, parent=None):
@@ -41,6 +46,7 @@ class DianDownloaderGUI(QMainWindow):
         self.config = {
             'prefijo_venta': 'FVP'
         }
+        self.token_cache = get_token_cache()
         self.initialize_ui()
         self.setup_logging()
 
@@ -57,21 +63,17 @@ class DianDownloaderGUI(QMainWindow):
         self.btn_excel.clicked.connect(self.load_excel)
         self.btn_folder = QPushButton('Seleccionar Carpeta Destino')
         self.btn_folder.clicked.connect(self.select_folder)
-        self.btn_extract = QPushButton('Extraer Datos')
-        self.btn_extract.clicked.connect(self.extract_data)
         self.btn_config = QPushButton('Configuración')
         self.btn_config.clicked.connect(self.show_config)
         
         top_layout.addWidget(self.btn_excel)
         top_layout.addWidget(self.btn_folder)
-        top_layout.addWidget(self.btn_extract)
         top_layout.addWidget(self.btn_config)
         
         self.lbl_excel = QLabel('No se ha seleccionado archivo Excel')
         self.lbl_folder = QLabel('No se ha seleccionado carpeta destino')
         self.table = QTableWidget()
-        self.log_viewer = QTextEdit()
-        self.log_viewer.setReadOnly(True)
+        self.log_viewer = LogViewer()
         self.url_label = QLabel('URL capturada:')
         self.url_text = QTextEdit()
         self.url_text.setReadOnly(True)
@@ -146,36 +148,68 @@ class DianDownloaderGUI(QMainWindow):
             logging.info("Configuración actualizada")
 
     def setup_logging(self):
-        class QTextEditLogger(logging.Handler):
-            def __init__(self, widget):
-                super().__init__()
-                self.widget = widget
-
-            def emit(self, record):
-                msg = self.format(record)
-                self.widget.append(msg)
-                
-        self.log_handler = QTextEditLogger(self.log_viewer)
-        self.log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        # El visor recibe los registros desde el hilo del QueueListener y los
+        # pinta en bloque desde el hilo de la interfaz
+        self.log_handler = LogViewerHandler(self.log_viewer)
+        start_queue_logging([self.log_handler], logging.INFO)
+
+    def download_pdf(self, cufe, token):
+        """Descarga el PDF del CUFE; retorna False si el portal rechaza el token"""
+        download_url = f"https://catalogo-vpfe.dian.gov.co/Document/DownloadPDF?trackId={cufe}&token={token}"
+        self.manifest.mark_token(cufe, download_url)
+        excel_name = os.path.splitext(os.path.basename(self.excel_path))[0]
+        filename = f"{excel_name}_{cufe}.pdf"
+        filepath = os.path.join(self.folder_path, filename)
+
+        with requests.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code != 200:
+                logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe}")
+                self.manifest.mark_failed(cufe, f"HTTP {response.status_code}")
+                return False
+            try:
+                sha256 = save_pdf_stream(response, filepath)
+            except PdfIntegrityError as e:
+                logging.error(f"PDF inválido para el CUFE {cufe}: {str(e)}")
+                self.manifest.mark_failed(cufe, str(e))
+                return False
+
+        logging.info(f"Archivo PDF descargado: {filename}")
+        self.manifest.mark_downloaded(cufe, filepath, sha256)
         
-        logger = logging.getLogger()
-        logger.addHandler(self.log_handler)
-        logger.setLevel(logging.INFO)
+        with open(os.path.join(self.folder_path, "links_descarga.txt"), "a") as file:
+            file.write(download_url + "\n")
+        return True
 
     def process_cufe(self, sb, cufe):
         try:
             url = "https://catalogo-vpfe.dian.gov.co/User/SearchDocument"
             logging.info(f"Procesando CUFE: {cufe}")
+
+            # Reutilizar un token capturado previamente antes de abrir el navegador
+            cached_token = self.token_cache.get(cufe)
+            if cached_token:
+                logging.info(f"Usando token en caché para el CUFE {cufe}")
+                try:
+                    if self.download_pdf(cufe, cached_token):
+                        return True
+                    logging.warning(f"Token en caché rechazado para el CUFE {cufe}")
+                except Exception as e:
+                    # Un error de red con el token en caché también pasa al navegador
+                    logging.warning(f"Error usando el token en caché para el CUFE {cufe}: {str(e)}")
+                self.token_cache.invalidate(cufe)
             
+            input_field = "input[placeholder='Ingrese el código CUFE o UUID']"
             sb.uc_open_with_reconnect(url, 4)
-            time.sleep(3)
+            wait_until(lambda: sb.is_element_visible(input_field), 'open')
 
-            logging.info("Resolviendo primer CAPTCHA...")
-            max_captcha_attempts = 3
+            # Con la autorización del portal vigente la página no muestra el CAPTCHA
+            max_captcha_attempts = 3 if captcha_shown(sb) else 0
+            if max_captcha_attempts:
+                logging.info("Resolviendo primer CAPTCHA...")
             for captcha_attempt in range(max_captcha_attempts):
                 try:
                     sb.uc_gui_click_captcha()
-                    time.sleep(4)
+                    wait_until(lambda: captcha_solved(sb), 'captcha')
                     break
                 except Exception as e:
                     if captcha_attempt == max_captcha_attempts - 1:
@@ -183,50 +217,34 @@ class DianDownloaderGUI(QMainWindow):
                     logging.warning(f"Error resolviendo el primer CAPTCHA (Intento {captcha_attempt+1}): {str(e)}")
                     time.sleep(2)
 
-            input_field = "input[placeholder='Ingrese el código CUFE o UUID']"
             sb.type(input_field, cufe)
-            time.sleep(2)
+            wait_until(lambda: sb.get_value(input_field) == cufe, 'type')
 
             sb.click("button:contains('Buscar')")
-            time.sleep(5)
+            try:
+                wait_until(lambda: token_in_url(sb.get_current_url()), 'search')
+            except WaitTimeout as e:
+                logging.warning(str(e))
 
             current_url = sb.get_current_url()
             logging.info(f"URL capturada: {current_url}")
             self.current_url = current_url
             self.url_text.setText(current_url)
 
-            with open("urls.txt", "a") as file:
-                file.write(f"{cufe}: {current_url}\n")
-
-            token = None
-            if "Token=" in current_url:
-                token = current_url.split("Token=")[1].split("&")[0]
-            elif "token=" in current_url:
-                token = current_url.split("token=")[1].split("&")[0]
+            self.token_cache.record(cufe, current_url)
 
+            token = parse_token(current_url)
             if token:
-                download_url = f"https://catalogo-vpfe.dian.gov.co/Document/DownloadPDF?trackId={cufe}&token={token}"
-                response = requests.get(download_url)
-                
-                if response.status_code == 200:
-                    excel_name = os.path.splitext(os.path.basename(self.excel_path))[0]
-                    filename = f"{excel_name}_{cufe}.pdf"
-                    filepath = os.path.join(self.folder_path, filename)
-                    with open(filepath, "wb") as file:
-                        file.write(response.content)
-                    logging.info(f"Archivo PDF descargado: {filename}")
-                    
-                    with open(os.path.join(self.folder_path, "links_descarga.txt"), "a") as file:
-                        file.write(download_url + "\n")
-                else:
-                    logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe}")
+                self.download_pdf(cufe, token)
             else:
                 logging.error(f"No se encontró el token en la URL para el CUFE {cufe}")
+                self.manifest.mark_failed(cufe, "Token no encontrado")
 
             return True
 
         except Exception as e:
             logging.error(f"Error procesando CUFE {cufe}: {str(e)}")
+            self.manifest.mark_failed(cufe, str(e))
             return False
 
     def stop_process(self):
@@ -244,14 +262,16 @@ class DianDownloaderGUI(QMainWindow):
             df = pd.read_excel(self.excel_path, sheet_name='Token')
             cufes = df['CUFE/CUDE'].dropna().tolist()
 
+            # Omitir los CUFEs que el manifiesto registra como ya descargados
+            self.manifest = DownloadManifest(self.folder_path)
+            total_cufes = len(cufes)
+            cufes = self.manifest.pending(cufes)
+            if len(cufes) < total_cufes:
+                logging.info(f"{total_cufes - len(cufes)} CUFEs ya descargados según el manifiesto, se omiten")
+
             progress = QProgressDialog("Procesando documentos...", "Cancelar", 0, len(cufes), self)
             progress.setWindowModality(QtCore.Qt.WindowModal)
 
-            excel_name = os.path.splitext(os.path.basename(self.excel_path))[0]
-
-            with open(os.path.join(self.folder_path, "links_descarga.txt"), "w") as file:
-                pass
-
             with SB(uc=True, test=True, incognito=True, locale_code="en") as sb:
                 for i, cufe in enumerate(cufes):
                     if not self.is_processing:
@@ -277,18 +297,14 @@ class DianDownloaderGUI(QMainWindow):
             QMessageBox.critical(self, "Error", f"Error en el proceso: {str(e)}")
             logging.error(f"Error en proceso principal: {str(e)}")
         finally:
+            if getattr(self, 'manifest', None):
+                self.manifest.close()
+                self.manifest = None
             self.is_processing = False
             self.btn_start.setEnabled(True)
             self.btn_stop.setEnabled(False)
             self.status_label.setText('Estado: Listo')
 
-    def extract_data(self):
-        if hasattr(self, 'folder_path') and hasattr(self, 'excel_path'):
-            process_downloaded_pdfs(self.folder_path, self.excel_path, self.config['prefijo_venta'])
-            QMessageBox.information(self, "Completado", "Extracción de datos finalizada exitosamente")
-        else:
-            QMessageBox.warning(self, "Advertencia", "Seleccione primero la carpeta de destino y el archivo Excel")
-
 def main():
     app = QApplication([])
     window = DianDownloaderGUI()
@@ -1,8 +1,10 @@
 from seleniumbase import SB
-import time
 import os
 import logging
 import requests
+from core.waits import wait_until, token_in_url, WaitTimeout
+from core.token_cache import get_token_cache
+from core.pdf_fetcher import build_pdf_path, save_pdf_stream, PdfIntegrityError, DOWNLOAD_TIMEOUT
 
 def process_cufe(self, driver, cufe):
         try:
@@ -14,7 +16,6 @@ def process_cufe(self, driver, cufe):
             logging.info(f"Procesando CUFE: {cufe}")
             
             driver.get(url)
-            time.sleep(3)
 
             logging.info("Esperando CAPTCHA...")
             # Esperar a que el iframe del CAPTCHA esté presente
@@ -28,7 +29,8 @@ def process_cufe(self, driver, cufe):
                     # Hacer clic en el checkbox
                     checkbox = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "recaptcha-checkbox-border")))
                     checkbox.click()
-                    time.sleep(4)  # Esperar a que se resuelva
+                    # Esperar a que se resuelva
+                    wait_until(lambda: driver.find_element(By.ID, "recaptcha-anchor").get_attribute("aria-checked") == "true", 'captcha')
                     driver.switch_to.default_content()
                     break
 
@@ -36,19 +38,21 @@ def process_cufe(self, driver, cufe):
             input_field = wait.until(EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "input[placeholder='Ingrese el código CUFE o UUID']")))
             input_field.send_keys(cufe)
-            time.sleep(2)
+            wait_until(lambda: input_field.get_attribute("value") == cufe, 'type')
 
             # Buscar
             search_button = wait.until(EC.element_to_be_clickable(
                 (By.XPATH, "//button[contains(text(),'Buscar')]")))
             search_button.click()
-            time.sleep(5)
+            try:
+                wait_until(lambda: token_in_url(driver.current_url), 'search')
+            except WaitTimeout as e:
+                logging.warning(str(e))
 
             current_url = driver.current_url
             logging.info(f"URL capturada: {current_url}")
 
-            with open("urls.txt", "a") as file:
-                file.write(f"{cufe}: {current_url}\n")
+            get_token_cache().record(cufe, current_url)
 
             token = None
             if "Token=" in current_url:
@@ -58,20 +62,20 @@ def process_cufe(self, driver, cufe):
 
             if token:
                 download_url = f"https://catalogo-vpfe.dian.gov.co/Document/DownloadPDF?trackId={cufe}&token={token}"
-                response = requests.get(download_url)
+                filepath = build_pdf_path(self.folder_path, self.excel_path, cufe)
                 
-                if response.status_code == 200:
-                    excel_name = os.path.splitext(os.path.basename(self.excel_path))[0]
-                    filename = f"{excel_name}_{cufe}.pdf"
-                    filepath = os.path.join(self.folder_path, filename)
-                    with open(filepath, "wb") as file:
-                        file.write(response.content)
-                    logging.info(f"Archivo PDF descargado: {filename}")
-                    
-                    with open(os.path.join(self.folder_path, "links_descarga.txt"), "a") as file:
-                        file.write(download_url + "\n")
-                else:
-                    logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe}")
+                with requests.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                    if response.status_code == 200:
+                        try:
+                            save_pdf_stream(response, filepath)
+                            logging.info(f"Archivo PDF descargado: {os.path.basename(filepath)}")
+                            
+                            with open(os.path.join(self.folder_path, "links_descarga.txt"), "a") as file:
+                                file.write(download_url + "\n")
+                        except PdfIntegrityError as e:
+                            logging.error(f"PDF inválido para el CUFE {cufe}: {str(e)}")
+                    else:
+                        logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe}")
             else:
                 logging.error(f"No se encontró el token en la URL para el CUFE {cufe}")
 
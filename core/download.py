@@ -0,0 +1,165 @@
+"""Descargador de CUFEs por línea de comandos, sin interfaz gráfica.
+
+Uso:
+    python -m core.download --excel X.xlsx --out DIR --workers N
+
+Imprime un resumen JSON en la salida estándar y termina con código 0 si todos
+los CUFEs se descargaron, 1 si alguno falló, 2 ante un error de entrada (un
+Excel ilegible o sin CUFEs válidos) y 130 si se interrumpe con Ctrl+C.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from core.download_engine import DownloadEngine, DEFAULT_WORKERS, MAX_WORKERS
+from core.pdf_fetcher import DEFAULT_FETCH_CONCURRENCY, PORTAL_URL
+from core.cufe_input import read_cufes
+from core.browser_pool import BrowserPool, browser_factory
+from core.log_pipeline import (start_queue_logging, stop_queue_logging, rotating_file_handler,
+                               LOG_FORMAT)
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_ERROR = 2
+EXIT_INTERRUPTED = 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m core.download',
+        description='Descarga por lotes los PDFs de la DIAN para los CUFEs de un Excel'
+    )
+    parser.add_argument('--excel', required=True,
+                        help='Archivo Excel con la hoja Token y la columna CUFE/CUDE')
+    parser.add_argument('--out', required=True, help='Carpeta de descarga')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Sesiones de navegador simultáneas (1-{MAX_WORKERS})')
+    parser.add_argument('--fetch-concurrency', type=int, default=DEFAULT_FETCH_CONCURRENCY,
+                        help='Descargas HTTP simultáneas')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Procesar también los CUFEs que el manifiesto marca como descargados')
+    parser.add_argument('--no-token-cache', action='store_true',
+                        help='No reutilizar tokens capturados previamente')
+    parser.add_argument('--portal-url', default=PORTAL_URL,
+                        help='URL base del portal (por ejemplo, un portal simulado local)')
+    parser.add_argument('--isolate-browsers', action='store_true',
+                        help='Ejecutar cada navegador en un proceso aparte vigilado por un watchdog')
+    parser.add_argument('--http-search', action='store_true',
+                        help='Tras resolver el CAPTCHA, buscar por HTTP con las cookies del '
+                             'navegador mientras el portal lo permita')
+    parser.add_argument('--reuse-page', action='store_true',
+                        help='Mantener cada navegador en la página de búsqueda y resolver el '
+                             'CAPTCHA solo cuando se muestre')
+    parser.add_argument('--lightweight-browser', action='store_true',
+                        help='Chrome sin imágenes, fuentes ni analítica y con servicios de '
+                             'fondo desactivados')
+    parser.add_argument('--summary', help='Guardar el resumen JSON en este archivo')
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-file',
+                        help='Guardar el log en este archivo, con rotación y compresión')
+    parser.add_argument('--log-json', action='store_true',
+                        help='Escribir --log-file como JSON por línea (cufe, file, stage, duration)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    handlers[0].setFormatter(logging.Formatter(LOG_FORMAT))
+    if args.log_file:
+        handlers.append(rotating_file_handler(args.log_file, args.log_json))
+    start_queue_logging(handlers, getattr(logging, args.log_level))
+    try:
+        return _run(args)
+    finally:
+        stop_queue_logging()
+
+
+def write_summary(args, summary):
+    """Imprime el resumen JSON y lo guarda en --summary si se indicó"""
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(text)
+    print(text)
+
+
+def _run(args):
+    # Los navegadores arrancan mientras se lee el Excel
+    browser_pool = BrowserPool(min(max(1, args.workers), MAX_WORKERS),
+                               browser_factory(args.lightweight_browser),
+                               isolate=args.isolate_browsers).start()
+    try:
+        batch = read_cufes(args.excel)
+    except Exception as e:
+        logging.error(f"Error al leer el archivo Excel: {str(e)}")
+        browser_pool.close()
+        return EXIT_ERROR
+    cufes = batch.cufes
+    if not cufes:
+        logging.error(f"El archivo {args.excel} no tiene CUFEs válidos")
+        browser_pool.close()
+        write_summary(args, {
+            'excel': args.excel,
+            'out': args.out,
+            'error': 'Sin CUFEs válidos',
+            'invalid_rows': [row for row, _ in batch.invalid],
+            'duplicate_rows': [row for row, _ in batch.duplicates]
+        })
+        return EXIT_ERROR
+    os.makedirs(args.out, exist_ok=True)
+
+    engine = DownloadEngine(
+        cufes,
+        args.out,
+        args.excel,
+        workers=args.workers,
+        resume=not args.no_resume,
+        use_token_cache=not args.no_token_cache,
+        fetch_concurrency=args.fetch_concurrency,
+        portal_url=args.portal_url,
+        browser_pool=browser_pool,
+        http_search=args.http_search,
+        reuse_page=args.reuse_page,
+        on_error=lambda cufe, error: logging.error(f"Error en CUFE {cufe}: {error}")
+    )
+
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(engine.run()), name='dian-engine')
+    start = time.monotonic()
+    interrupted = False
+    runner.start()
+    while runner.is_alive():
+        try:
+            runner.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logging.warning("Interrumpido por el usuario, deteniendo descargas...")
+            interrupted = True
+            engine.stop()
+
+    summary = {
+        'excel': args.excel,
+        'out': args.out,
+        'workers': engine.workers,
+        'elapsed_seconds': round(time.monotonic() - start, 1),
+        'interrupted': interrupted,
+        'invalid_rows': [row for row, _ in batch.invalid],
+        'duplicate_rows': [row for row, _ in batch.duplicates]
+    }
+    summary.update(result)
+    summary['downloaded'] = summary.get('completed', 0) - len(summary.get('failed', []))
+    write_summary(args, summary)
+
+    if interrupted:
+        return EXIT_INTERRUPTED
+    if not result or summary.get('failed'):
+        return EXIT_FAILURES
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
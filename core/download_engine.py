@@ -0,0 +1,291 @@
+import queue
+import logging
+import threading
+from core.browser_pool import BrowserPool, browser_factory
+from core.process_worker import WorkerLost
+from core.cancellation import CancelToken, Cancelled
+from core.browser_capture import SEARCH_PATH
+from core.manifest import DownloadManifest
+from core.metrics import StageMetrics
+from core.token_cache import get_token_cache, parse_token
+from core.pdf_fetcher import PdfFetcher, DEFAULT_FETCH_CONCURRENCY, PORTAL_URL
+from core.rate_control import RateController
+from core.retry import (RetryScheduler, DownloadFailure, classify_error,
+                        write_dead_letters, NO_TOKEN, TIMEOUT)
+
+# Configuración del pool de sesiones
+DEFAULT_WORKERS = 1
+MAX_WORKERS = 8
+QUEUE_POLL_INTERVAL = 0.5
+
+
+class DownloadEngine:
+    """Pipeline de descarga de CUFEs en dos etapas.
+
+    Hilos de captura toman CUFEs de una cola compartida y capturan sus tokens
+    con navegadores de un BrowserPool; un PdfFetcher descarga los PDFs en paralelo. Los CUFEs
+    con un token vigente en la caché van directo a la etapa de descarga. Las
+    fallas se reprograman con RetryScheduler y los CUFEs que agotan sus
+    intentos se guardan en la hoja de fallidos. Un RateController compartido
+    regula cuántas búsquedas y descargas hay en vuelo contra el portal y
+    StageMetrics registra la latencia de cada etapa en la carpeta de descarga.
+    stop() activa un CancelToken que interrumpe las esperas, las capturas y
+    las descargas en curso; los CUFEs interrumpidos quedan pendientes en el
+    manifiesto para retomarlos en la siguiente corrida.
+    """
+
+    def __init__(self, cufes, folder_path, excel_path, workers=DEFAULT_WORKERS,
+                 on_progress=None, on_error=None, resume=True, use_token_cache=True,
+                 fetch_concurrency=DEFAULT_FETCH_CONCURRENCY, portal_url=PORTAL_URL,
+                 browser_pool=None, isolate_browsers=False, http_search=False,
+                 reuse_page=False, lightweight_browser=False):
+        self.cufes = list(cufes)
+        self.folder_path = folder_path
+        self.excel_path = excel_path
+        self.resume = resume
+        self.portal_url = portal_url.rstrip("/")
+        self.manifest = None
+        self.metrics = None
+        self.token_cache = get_token_cache() if use_token_cache else None
+        self.fetcher = None
+        # El motor se queda con el pool y lo cierra al terminar run()
+        self.browser_pool = browser_pool
+        self.isolate_browsers = isolate_browsers
+        # Búsquedas por HTTP con las cookies del navegador tras resolver el CAPTCHA
+        self.http_search = http_search
+        # Mantiene cada navegador en la página de búsqueda entre CUFEs
+        self.reuse_page = reuse_page
+        # Perfil liviano de Chrome: sin imágenes, fuentes ni analítica
+        self.lightweight_browser = lightweight_browser
+        self.fetch_concurrency = fetch_concurrency
+        self.skipped = 0
+        self.workers = max(1, min(int(workers), MAX_WORKERS))
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.is_running = True
+        self.cancel = CancelToken()
+        self.completed = 0
+        self.failed = []
+        self.retries = RetryScheduler()
+        self.rate_controller = RateController(self.workers, fetch_concurrency)
+        self.dead_letter_path = None
+        self._outstanding = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Procesa todos los CUFEs y retorna cuando todos terminan o se detiene"""
+        self.manifest = DownloadManifest(self.folder_path)
+        self.metrics = StageMetrics(self.folder_path)
+        if self.browser_pool is None:
+            self.browser_pool = BrowserPool(self.workers,
+                                            browser_factory(self.lightweight_browser),
+                                            isolate=self.isolate_browsers,
+                                            cancel=self.cancel)
+        else:
+            # Pool precalentado: también deja de lanzar navegadores al cancelar
+            self.browser_pool.cancel = self.cancel
+            self.browser_pool.resize(self.workers)
+        try:
+            return self._run()
+        finally:
+            if self.cancel.cancelled:
+                # Cerrar Chrome tarda; el hilo no es daemon para que termine antes de salir
+                threading.Thread(target=self.browser_pool.close, name="dian-browser-close").start()
+            else:
+                self.browser_pool.close()
+            self.metrics.close()
+            self.manifest.close()
+
+    def _run(self):
+        total = len(self.cufes)
+        if self.resume:
+            self.cufes = self.manifest.pending(self.cufes)
+        else:
+            self.manifest.register(self.cufes)
+        self.skipped = total - len(self.cufes)
+        if self.skipped:
+            logging.info(f"{self.skipped} CUFEs ya descargados según el manifiesto, se omiten")
+        self._outstanding = len(self.cufes)
+
+        self.fetcher = PdfFetcher(self.folder_path, self.excel_path, self.manifest,
+                                  concurrency=self.fetch_concurrency,
+                                  on_done=self._on_fetched,
+                                  limiter=self.rate_controller.fetch,
+                                  portal_url=self.portal_url,
+                                  metrics=self.metrics,
+                                  cancel=self.cancel)
+        self.fetcher.start()
+
+        for cufe in self.cufes:
+            self.metrics.begin(cufe)
+            cached_token = self.token_cache.get(cufe) if self.token_cache else None
+            if cached_token:
+                logging.info(f"Usando token en caché para el CUFE {cufe}")
+                self.fetcher.submit(cufe, cached_token, from_cache=True)
+            else:
+                self._queue.put(cufe)
+
+        sessions = min(self.workers, len(self.cufes))
+        threads = [
+            threading.Thread(target=self._session_loop, args=(i + 1,),
+                             name=f"dian-session-{i + 1}", daemon=True)
+            for i in range(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.fetcher.close()
+        # CUFEs que quedaron en cola sin sesiones de navegador disponibles
+        while self.is_running:
+            cufe = self._next_cufe(block=False)
+            if cufe is None:
+                break
+            self._report(cufe, False, "Sin sesiones de navegador disponibles")
+        # Los reintentos que aún esperan su turno tampoco tienen sesión que los tome
+        if self.is_running:
+            for cufe in self.retries.drain("Sin sesiones de navegador disponibles"):
+                self._report(cufe, False, "Sin sesiones de navegador para reintentar")
+
+        logging.info(f"Límites finales del control de tasa: {self.rate_controller.limits()}")
+        latency = self.metrics.summary()
+        if self.retries.dead_letters:
+            self.dead_letter_path = write_dead_letters(self.retries.dead_letters,
+                                                       self.folder_path)
+
+        return {
+            'total': total,
+            'skipped': self.skipped,
+            'completed': self.completed,
+            'failed': list(self.failed),
+            'dead_letters': list(self.retries.dead_letters),
+            'dead_letter_path': self.dead_letter_path,
+            'limits': self.rate_controller.limits(),
+            'browsers': self.browser_pool.snapshot(),
+            'latency': latency,
+            'metrics_path': self.metrics.path,
+            'cancelled': self.cancel.cancelled
+        }
+
+    def stop(self):
+        self.is_running = False
+        self.cancel.cancel()
+
+    def _has_work(self):
+        with self._lock:
+            return self.is_running and self._outstanding > 0
+
+    def _next_cufe(self, block=True):
+        # Los reintentos cuya espera ya terminó tienen prioridad sobre la cola
+        cufe = self.retries.pop_due()
+        if cufe is not None:
+            return cufe
+        try:
+            if block:
+                return self._queue.get(timeout=QUEUE_POLL_INTERVAL)
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _session_loop(self, session_id):
+        """Captura tokens con navegadores del pool mientras queden CUFEs por terminar.
+
+        Los navegadores solo se lanzan cuando llega el primer CUFE que los
+        necesita, salvo que el pool se haya precalentado con start().
+        """
+        while self._has_work():
+            cufe = self._next_cufe()
+            if cufe is None:
+                continue
+            session = self.browser_pool.acquire(self._has_work)
+            if session is None:
+                # El CUFE vuelve a la cola para reportarlo al terminar
+                self._queue.put(cufe)
+                if self.browser_pool.broken:
+                    self._emit_error("Sistema", f"Sesión {session_id} sin navegador disponible")
+                    return
+                continue
+            try:
+                self._capture(session, cufe)
+            finally:
+                self.browser_pool.release(session)
+
+    def _capture(self, session, cufe):
+        """Captura el token de un CUFE y lo envía a la etapa de descarga"""
+        with self.metrics.stage(cufe, 'rate_wait'):
+            started = self.rate_controller.search.acquire(self._has_work)
+        if started is None:
+            self._queue.put(cufe)
+            return
+
+        logging.info(f"Procesando CUFE: {cufe}")
+        try:
+            current_url = session.capture(cufe, self.portal_url + SEARCH_PATH, self.metrics,
+                                          self.http_search, self.reuse_page, self.cancel)
+        except Cancelled:
+            # Sin marcar falla: el CUFE sigue pendiente en el manifiesto
+            self.rate_controller.search.abandon()
+            logging.info(f"Captura del CUFE {cufe} interrumpida")
+            return
+        except WorkerLost as e:
+            # El watchdog terminó el proceso: el pool lo reemplaza y el CUFE se reintenta
+            self.rate_controller.search.release(started, False)
+            logging.error(f"Proceso de captura perdido con el CUFE {cufe}: {str(e)}")
+            self._fail(cufe, DownloadFailure(TIMEOUT, str(e)))
+            return
+        except Exception as e:
+            self.rate_controller.search.release(started, False)
+            logging.error(f"Error procesando CUFE {cufe}: {str(e)}")
+            self.manifest.mark_failed(cufe, str(e))
+            self._fail(cufe, e)
+            return
+
+        token = parse_token(current_url)
+        self.rate_controller.search.release(started, bool(token))
+        if not token:
+            logging.error(f"No se encontró el token en la URL para el CUFE {cufe}")
+            self.manifest.mark_failed(cufe, "Token no encontrado")
+            self._fail(cufe, DownloadFailure(NO_TOKEN, "Token no encontrado"))
+            return
+
+        if self.token_cache:
+            self.token_cache.record(cufe, current_url)
+        self.fetcher.submit(cufe, token)
+
+    def _on_fetched(self, cufe, success, from_cache, error=None):
+        if success:
+            self._report(cufe, True)
+        elif from_cache:
+            # El portal rechazó el token en caché: volver a capturarlo con el navegador
+            logging.warning(f"Token en caché rechazado para el CUFE {cufe}")
+            self.token_cache.invalidate(cufe)
+            self._queue.put(cufe)
+        else:
+            self._fail(cufe, error)
+
+    def _fail(self, cufe, error):
+        """Reprograma el CUFE según la clase de falla o lo da por fallido"""
+        kind = classify_error(error)
+        scheduled = self.retries.schedule(cufe, kind, error)
+        self.metrics.set_attempt(cufe, self.retries.attempts.get(cufe, 0))
+        if not scheduled:
+            self._report(cufe, False, f"Falla definitiva ({kind}): {error}")
+
+    def _report(self, cufe, success, reason="Error procesando CUFE"):
+        with self._lock:
+            self.completed += 1
+            self._outstanding -= 1
+            if not success:
+                self.failed.append(cufe)
+            value = int(self.completed * 100 / len(self.cufes))
+        self.metrics.finish(cufe, 'ok' if success else 'failed')
+        if not success:
+            self._emit_error(cufe, reason)
+        if self.on_progress:
+            self.on_progress(value)
+
+    def _emit_error(self, cufe, message):
+        if self.on_error:
+            self.on_error(cufe, message)
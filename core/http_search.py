@@ -0,0 +1,139 @@
+import logging
+from contextlib import nullcontext
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import requests
+from core.token_cache import parse_token
+from core.browser_capture import capture_token
+
+CUFE_PLACEHOLDER = "Ingrese el código CUFE o UUID"
+DEFAULT_CUFE_FIELD = "DocumentKey"
+HTTP_SEARCH_TIMEOUT = 20
+MAX_REDIRECTS = 3
+
+
+class ChallengeRequired(Exception):
+    """El portal volvió a pedir CAPTCHA: la búsqueda debe hacerse con el navegador"""
+
+
+class _SearchFormParser(HTMLParser):
+    """Extrae la acción y los campos del formulario de búsqueda"""
+
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = {}
+        self.cufe_field = None
+        self._in_form = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and self.action is None:
+            self._in_form = True
+            self.action = attrs.get("action") or ""
+        elif tag == "input" and self._in_form and attrs.get("name"):
+            if attrs.get("placeholder") == CUFE_PLACEHOLDER:
+                self.cufe_field = attrs["name"]
+            elif attrs.get("type", "text").lower() == "hidden":
+                self.fields[attrs["name"]] = attrs.get("value") or ""
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._in_form = False
+
+
+class HttpSearchClient:
+    """Busca CUFEs por HTTP con las cookies de una sesión de navegador ya validada.
+
+    Envía el formulario de búsqueda con requests y lee el Token= de la
+    redirección. Si el portal responde con la página de búsqueda en lugar del
+    documento (nuevo desafío), lanza ChallengeRequired.
+    """
+
+    def __init__(self, search_url, cookies=(), user_agent=None):
+        self.search_url = search_url
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers["User-Agent"] = user_agent
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"],
+                                     domain=cookie.get("domain"), path=cookie.get("path", "/"))
+
+    @classmethod
+    def from_browser(cls, sb, search_url):
+        """Copia las cookies y el User-Agent del navegador"""
+        return cls(search_url, sb.driver.get_cookies(),
+                   sb.execute_script("return navigator.userAgent;"))
+
+    def search(self, cufe, cancel=None):
+        """Retorna la URL con el token del CUFE; cancel interrumpe las solicitudes en curso"""
+        if cancel is None:
+            return self._search(cufe)
+        with cancel.on_cancel(self.session.close):
+            return self._search(cufe)
+
+    def _search(self, cufe):
+        response = self.session.get(self.search_url, timeout=HTTP_SEARCH_TIMEOUT)
+        response.raise_for_status()
+        form = _SearchFormParser()
+        form.feed(response.text)
+        if form.action is None:
+            raise ChallengeRequired("La página de búsqueda no trae el formulario")
+
+        data = dict(form.fields)
+        data[form.cufe_field or DEFAULT_CUFE_FIELD] = cufe
+        url = urljoin(response.url, form.action) if form.action else response.url
+        response = self.session.post(url, data=data, allow_redirects=False,
+                                     timeout=HTTP_SEARCH_TIMEOUT)
+        for _ in range(MAX_REDIRECTS):
+            location = response.headers.get("Location")
+            if not response.is_redirect or not location:
+                break
+            url = urljoin(url, location)
+            if parse_token(url):
+                return url
+            response = self.session.get(url, allow_redirects=False, timeout=HTTP_SEARCH_TIMEOUT)
+        response.raise_for_status()
+        if parse_token(response.url):
+            return response.url
+        raise ChallengeRequired("El portal no entregó el token por HTTP")
+
+    def close(self):
+        self.session.close()
+
+
+class SearchHandoff:
+    """Captura tokens por HTTP cuando se puede y con el navegador cuando no.
+
+    Tras cada captura exitosa con el navegador exporta sus cookies a un
+    HttpSearchClient; mientras el portal acepte esa sesión, las búsquedas
+    siguientes no renderizan la página.
+    """
+
+    def __init__(self, sb):
+        self.sb = sb
+        self.client = None
+
+    def capture(self, cufe, search_url, metrics=None, http_search=False, reuse_page=False,
+                cancel=None):
+        if http_search and self.client is not None:
+            stage = metrics.stage(cufe, 'http_search') if metrics else nullcontext({})
+            try:
+                with stage:
+                    return self.client.search(cufe, cancel)
+            except (ChallengeRequired, requests.RequestException) as e:
+                logging.info(f"Búsqueda HTTP no disponible, se usa el navegador: {str(e)}")
+                self.drop_client()
+
+        url = capture_token(self.sb, cufe, search_url, metrics, reuse_page, cancel)
+        if http_search and parse_token(url):
+            try:
+                self.client = HttpSearchClient.from_browser(self.sb, search_url)
+            except Exception as e:
+                logging.warning(f"No se pudieron exportar las cookies del navegador: {str(e)}")
+        return url
+
+    def drop_client(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
@@ -0,0 +1,129 @@
+import os
+import gzip
+import json
+import queue
+import shutil
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler,
+                              TimedRotatingFileHandler)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s: %(message)s'
+
+# Rotación por defecto: 5 MB por archivo, 10 archivos comprimidos
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+
+# Campos opcionales que se pasan con extra={...} y van al formato JSON
+EXTRA_FIELDS = ('cufe', 'file', 'stage', 'duration')
+
+_listener = None
+_lock = threading.Lock()
+
+
+class _DynamicListener(QueueListener):
+    """QueueListener al que se le pueden agregar y quitar handlers en caliente"""
+
+    def add_handler(self, handler):
+        with _lock:
+            self.handlers = self.handlers + (handler,)
+
+    def remove_handler(self, handler):
+        with _lock:
+            self.handlers = tuple(h for h in self.handlers if h is not handler)
+
+    def handle(self, record):
+        record = self.prepare(record)
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objeto JSON por línea con los campos cufe, file, stage y duration si vienen"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def rotating_file_handler(path, json_lines=False, max_bytes=LOG_MAX_BYTES,
+                          backup_count=LOG_BACKUP_COUNT, when=None):
+    """Handler de archivo con rotación y compresión gzip de los archivos viejos.
+
+    Rota por tamaño (max_bytes) o, si se indica when ('midnight', 'H', ...),
+    por tiempo. Con json_lines escribe un objeto JSON por registro.
+    """
+    if when:
+        handler = TimedRotatingFileHandler(path, when=when, backupCount=backup_count,
+                                           encoding='utf-8', delay=True)
+    else:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                      encoding='utf-8', delay=True)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def start_queue_logging(handlers, level=logging.INFO):
+    """Envía todos los registros del logger raíz a una cola.
+
+    Un único hilo (QueueListener) los entrega a los handlers, de modo que los
+    hilos de descarga nunca escriben directamente en archivos ni en widgets.
+    """
+    global _listener
+    stop_queue_logging()
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    _listener = _DynamicListener(log_queue, *handlers)
+    _listener.start()
+    return _listener
+
+
+def stop_queue_logging():
+    """Vacía la cola y detiene el hilo de logging"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def attach_handler(handler):
+    """Agrega un handler al pipeline activo o, si no hay, al logger raíz"""
+    if _listener is not None:
+        _listener.add_handler(handler)
+    else:
+        logging.getLogger().addHandler(handler)
+
+
+def detach_handler(handler):
+    if _listener is not None:
+        _listener.remove_handler(handler)
+    logging.getLogger().removeHandler(handler)
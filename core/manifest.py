@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+
+MANIFEST_NAME = "manifest_descargas.sqlite"
+
+# Estados de un CUFE dentro del manifiesto
+PENDING = 'pending'
+TOKEN_CAPTURED = 'token_captured'
+DOWNLOADED = 'downloaded'
+FAILED = 'failed'
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Calcula el SHA-256 de un archivo leyendo por bloques"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """Registro persistente (SQLite) del estado de cada CUFE en una carpeta de descarga.
+
+    Después de close() las escrituras se ignoran: al cancelar, una descarga
+    que sigue esperando al portal puede terminar cuando el motor ya cerró.
+    """
+
+    def __init__(self, folder_path, name=MANIFEST_NAME):
+        self.path = os.path.join(folder_path, name)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cufes (
+                cufe TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                url TEXT,
+                file_path TEXT,
+                size INTEGER,
+                sha256 TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._conn.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            if self._closed:
+                logging.debug(f"Manifiesto cerrado, se omite la escritura: {sql.split()[0]}")
+                return None
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def register(self, cufes):
+        """Agrega como pendientes los CUFEs que aún no están en el manifiesto"""
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO cufes (cufe, state, updated_at) VALUES (?, ?, ?)",
+                [(cufe, PENDING, now) for cufe in cufes]
+            )
+            self._conn.commit()
+
+    def get(self, cufe):
+        """Retorna el registro de un CUFE como diccionario, o None"""
+        with self._lock:
+            if self._closed:
+                return None
+            cursor = self._conn.execute("SELECT * FROM cufes WHERE cufe = ?", (cufe,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            columns = [column[0] for column in cursor.description]
+        return dict(zip(columns, row))
+
+    def is_done(self, cufe):
+        """Verdadero si el CUFE ya se descargó y el archivo sigue intacto en disco"""
+        record = self.get(cufe)
+        if not record or record['state'] != DOWNLOADED:
+            return False
+        file_path = record['file_path']
+        return bool(file_path) and os.path.isfile(file_path) \
+            and os.path.getsize(file_path) == record['size']
+
+    def pending(self, cufes):
+        """Registra los CUFEs y retorna, en orden, los que faltan por descargar"""
+        self.register(cufes)
+        return [cufe for cufe in cufes if not self.is_done(cufe)]
+
+    def mark_token(self, cufe, url):
+        self._execute(
+            "UPDATE cufes SET state = ?, url = ?, error = NULL, updated_at = ? WHERE cufe = ?",
+            (TOKEN_CAPTURED, url, time.time(), cufe)
+        )
+
+    def mark_downloaded(self, cufe, file_path, sha256=None):
+        size = os.path.getsize(file_path)
+        sha256 = sha256 or file_sha256(file_path)
+        self._execute(
+            "UPDATE cufes SET state = ?, file_path = ?, size = ?, sha256 = ?, error = NULL, "
+            "attempts = attempts + 1, updated_at = ? WHERE cufe = ?",
+            (DOWNLOADED, file_path, size, sha256, time.time(), cufe)
+        )
+
+    def mark_failed(self, cufe, error):
+        self._execute(
+            "UPDATE cufes SET state = ?, error = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE cufe = ?",
+            (FAILED, str(error), time.time(), cufe)
+        )
+
+    def counts(self):
+        """Cantidad de CUFEs por estado; vacío si el manifiesto ya se cerró"""
+        with self._lock:
+            if self._closed:
+                return {}
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM cufes GROUP BY state").fetchall()
+        return dict(rows)
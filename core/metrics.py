@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_FILE = "metricas_descarga.jsonl"
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100))
+    return values[min(rank, len(values)) - 1]
+
+
+class StageTimings:
+    """Acumula tiempos de etapa para registrarlos después en un StageMetrics.
+
+    Tiene la misma interfaz stage() que StageMetrics, de modo que capture_token
+    la puede usar en un proceso hijo y devolver las mediciones al padre.
+    on_stage() se llama al entrar y al salir de cada etapa.
+    """
+
+    def __init__(self, on_stage=None):
+        self.entries = []
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, cufe, name):
+        timing = {'outcome': 'ok'}
+        start = time.monotonic()
+        if self.on_stage:
+            self.on_stage()
+        try:
+            yield timing
+        except BaseException as e:
+            timing['outcome'] = type(e).__name__
+            raise
+        finally:
+            self.entries.append((name, time.monotonic() - start, timing['outcome']))
+            if self.on_stage:
+                self.on_stage()
+
+
+class StageMetrics:
+    """Registra la duración de cada etapa de cada CUFE en un archivo JSONL.
+
+    Cada línea es un objeto con el lote, el CUFE, la etapa, los segundos, el
+    resultado y el número de reintento. Al cerrar el lote se agrega una línea
+    de resumen con los percentiles p50/p95/p99 por etapa.
+    """
+
+    def __init__(self, folder_path, filename=METRICS_FILE):
+        self.path = os.path.join(folder_path, filename)
+        self.batch = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self._durations = {}
+        self._failures = {}
+        self._attempts = {}
+        self._started = {}
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def set_attempt(self, cufe, attempt):
+        """Número de reintento con que se registran las próximas etapas del CUFE"""
+        with self._lock:
+            self._attempts[cufe] = attempt
+
+    def begin(self, cufe):
+        """Marca el inicio del CUFE para medir su duración total"""
+        with self._lock:
+            self._started.setdefault(cufe, time.monotonic())
+
+    def finish(self, cufe, outcome):
+        """Registra la duración total del CUFE desde begin()"""
+        with self._lock:
+            started = self._started.pop(cufe, None)
+        if started is not None:
+            self.record(cufe, 'total', time.monotonic() - started, outcome)
+
+    @contextmanager
+    def stage(self, cufe, name):
+        """Mide el bloque como la etapa name del CUFE.
+
+        El diccionario entregado permite cambiar 'outcome'; una excepción lo
+        marca con el nombre de su clase y se vuelve a lanzar.
+        """
+        timing = {'outcome': 'ok'}
+        start = time.monotonic()
+        try:
+            yield timing
+        except BaseException as e:
+            timing['outcome'] = type(e).__name__
+            raise
+        finally:
+            self.record(cufe, name, time.monotonic() - start, timing['outcome'])
+
+    def record(self, cufe, stage, seconds, outcome='ok'):
+        with self._lock:
+            entry = {
+                'ts': datetime.now().isoformat(timespec='milliseconds'),
+                'batch': self.batch,
+                'cufe': cufe,
+                'stage': stage,
+                'seconds': round(seconds, 3),
+                'outcome': outcome,
+                'attempt': self._attempts.get(cufe, 0)
+            }
+            self._durations.setdefault(stage, []).append(seconds)
+            if outcome != 'ok':
+                self._failures[stage] = self._failures.get(stage, 0) + 1
+            if not self._file.closed:
+                self._file.write(json.dumps(entry) + "\n")
+                self._file.flush()
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Etapa '{stage}' del CUFE {cufe}: {seconds:.2f}s ({outcome})",
+                          extra={'cufe': cufe, 'stage': stage, 'duration': round(seconds, 3)})
+
+    def summary(self):
+        """Percentiles de duración (segundos) por etapa del lote actual"""
+        with self._lock:
+            durations = {stage: sorted(values) for stage, values in self._durations.items()}
+            failures = dict(self._failures)
+        result = {}
+        for stage, values in durations.items():
+            stats = {'count': len(values), 'failures': failures.get(stage, 0),
+                     'mean': round(sum(values) / len(values), 3)}
+            for p in PERCENTILES:
+                stats[f'p{p}'] = round(percentile(values, p), 3)
+            result[stage] = stats
+        return result
+
+    def close(self):
+        """Escribe el resumen del lote, lo registra en el log y cierra el archivo"""
+        summary = self.summary()
+        if self._file.closed:
+            return summary
+        for stage, stats in summary.items():
+            logging.info(f"Latencia '{stage}': n={stats['count']} p50={stats['p50']}s "
+                         f"p95={stats['p95']}s p99={stats['p99']}s fallas={stats['failures']}")
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(json.dumps({'batch': self.batch, 'summary': summary}) + "\n")
+                self._file.close()
+        return summary
@@ -0,0 +1,314 @@
+"""Portal DIAN simulado para medir el descargador sin depender del sitio real.
+
+Reproduce la forma del portal: la página User/SearchDocument con el campo
+CUFE, el botón Buscar y un CAPTCHA que se "resuelve" tras una demora; la
+redirección a ShowDocumentToPublic con Token= y Document/DownloadPDF, que
+sirve los PDFs de una carpeta local. La latencia, la tasa de errores y la
+demora del CAPTCHA son configurables. Cada respuesta de CAPTCHA sirve una sola
+vez y deja una cookie de autorización válida para clearance_uses búsquedas más
+sin CAPTCHA, como la cookie de validación del portal real; mientras esa cookie
+esté vigente la página de búsqueda se sirve sin el widget de CAPTCHA.
+
+Uso:
+    python -m core.mock_portal --port 8765 --latency 0.5 --error-rate 0.05
+"""
+import os
+import re
+import sys
+import hmac
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "prueba descargador")
+CUFE_PATTERN = re.compile(r"([0-9a-f]{96})", re.IGNORECASE)
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Consulta de documentos</title></head>
+<body>
+<form method="post" action="/User/SearchDocument">
+  <input type="hidden" name="__RequestVerificationToken" value="{csrf}">
+{challenge}  <input type="text" name="DocumentKey" placeholder="Ingrese el código CUFE o UUID">
+  <button type="submit">Buscar</button>
+</form>
+</body>
+</html>
+"""
+
+# Widget de CAPTCHA; se omite mientras la cookie de autorización siga vigente
+CHALLENGE_WIDGET = """  <input type="hidden" name="cf-turnstile-response" value="">
+  <script>
+    setTimeout(function () {{
+      document.querySelector("[name='cf-turnstile-response']").value = "{captcha}";
+    }}, {captcha_delay_ms});
+  </script>
+"""
+
+DOCUMENT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Documento</title></head>
+<body><p>Documento {cufe}</p></body></html>
+"""
+
+
+class PortalConfig:
+    """Parámetros de comportamiento del portal simulado"""
+
+    def __init__(self, pdf_dir=DEFAULT_PDF_DIR, latency=0.3, jitter=0.2, error_rate=0.0,
+                 captcha_delay=1.0, token_ttl=3600, clearance_uses=10):
+        self.pdf_dir = pdf_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.captcha_delay = captcha_delay
+        self.token_ttl = token_ttl
+        self.clearance_uses = clearance_uses
+        self.secret = os.urandom(16)
+
+
+def index_pdfs(pdf_dir):
+    """Indexa los PDFs de la carpeta por el CUFE que traen en el nombre"""
+    by_cufe = {}
+    files = []
+    if os.path.isdir(pdf_dir):
+        for name in sorted(os.listdir(pdf_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(pdf_dir, name)
+            files.append(path)
+            match = CUFE_PATTERN.search(name)
+            if match:
+                by_cufe[match.group(1).lower()] = path
+    return by_cufe, files
+
+
+class MockPortal:
+    """Servidor HTTP del portal simulado, ejecutado en un hilo propio"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or PortalConfig()
+        self.pdfs_by_cufe, self.pdf_files = index_pdfs(self.config.pdf_dir)
+        self.stats = {'searches': 0, 'downloads': 0, 'errors': 0, 'rejected_tokens': 0,
+                      'challenges': 0}
+        self._stats_lock = threading.Lock()
+        self._captchas = set()
+        self._clearances = {}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="dian-mock-portal", daemon=True)
+        self._thread.start()
+        logging.info(f"Portal simulado escuchando en {self.url} "
+                     f"({len(self.pdf_files)} PDFs disponibles)")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def issue_captcha(self):
+        value = os.urandom(8).hex()
+        with self._stats_lock:
+            self._captchas.add(value)
+        return value
+
+    def cleared(self, clearance):
+        """Verdadero si la cookie de autorización todavía permite buscar sin CAPTCHA"""
+        with self._stats_lock:
+            return bool(clearance) and self._clearances.get(clearance, 0) > 0
+
+    def authorize(self, captcha, clearance):
+        """Valida la búsqueda; retorna la cookie de autorización o None si hay desafío"""
+        with self._stats_lock:
+            if captcha and captcha in self._captchas:
+                self._captchas.discard(captcha)
+                clearance = os.urandom(8).hex()
+                self._clearances[clearance] = self.config.clearance_uses
+                return clearance
+            if clearance and self._clearances.get(clearance, 0) > 0:
+                self._clearances[clearance] -= 1
+                return clearance
+            self.stats['challenges'] += 1
+            return None
+
+    def make_token(self, cufe, issued_at=None):
+        issued_at = int(issued_at if issued_at is not None else time.time())
+        signature = hmac.new(self.config.secret, f"{cufe}:{issued_at}".encode(),
+                             hashlib.sha256).hexdigest()[:32]
+        return f"{issued_at:x}{signature}"
+
+    def check_token(self, cufe, token):
+        try:
+            issued_at = int(token[:-32], 16)
+        except ValueError:
+            return False
+        if time.time() - issued_at > self.config.token_ttl:
+            return False
+        return hmac.compare_digest(self.make_token(cufe, issued_at), token)
+
+    def pdf_for(self, cufe):
+        path = self.pdfs_by_cufe.get(cufe.lower())
+        if path is None and self.pdf_files:
+            index = int(hashlib.sha256(cufe.encode()).hexdigest(), 16) % len(self.pdf_files)
+            path = self.pdf_files[index]
+        return path
+
+    def _handler_class(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logging.debug("Portal simulado: " + format % args)
+
+            def _delay(self):
+                config = portal.config
+                time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+            def _fail_randomly(self):
+                if random.random() < portal.config.error_rate:
+                    portal.count('errors')
+                    self._send(503, "text/plain", b"Servicio no disponible")
+                    return True
+                return False
+
+            def _send(self, status, content_type, body, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _clearance(self):
+                cookies = SimpleCookie(self.headers.get("Cookie", ""))
+                return cookies["clearance"].value if "clearance" in cookies else None
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                self._delay()
+                if self._fail_randomly():
+                    return
+
+                if parsed.path == "/User/SearchDocument":
+                    challenge = ""
+                    if not portal.cleared(self._clearance()):
+                        challenge = CHALLENGE_WIDGET.format(
+                            captcha=portal.issue_captcha(),
+                            captcha_delay_ms=int(portal.config.captcha_delay * 1000)
+                        )
+                    page = SEARCH_PAGE.format(csrf=os.urandom(8).hex(), challenge=challenge)
+                    self._send(200, "text/html; charset=utf-8", page.encode("utf-8"))
+                elif parsed.path.startswith("/Document/ShowDocumentToPublic/"):
+                    cufe = parsed.path.rsplit("/", 1)[-1]
+                    self._send(200, "text/html; charset=utf-8",
+                               DOCUMENT_PAGE.format(cufe=cufe).encode("utf-8"))
+                elif parsed.path == "/Document/DownloadPDF":
+                    cufe = query.get("trackId", [""])[0]
+                    token = query.get("token", [""])[0]
+                    if not portal.check_token(cufe, token):
+                        portal.count('rejected_tokens')
+                        self._send(200, "text/html; charset=utf-8",
+                                   b"<html><body>Documento no disponible</body></html>")
+                        return
+                    path = portal.pdf_for(cufe)
+                    if path is None:
+                        self._send(404, "text/plain", b"Sin PDFs de prueba")
+                        return
+                    with open(path, "rb") as file:
+                        body = file.read()
+                    portal.count('downloads')
+                    self._send(200, "application/pdf", body)
+                else:
+                    self._send(404, "text/plain", b"No encontrado")
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                self._delay()
+                if self._fail_randomly():
+                    return
+
+                if parsed.path != "/User/SearchDocument":
+                    self._send(404, "text/plain", b"No encontrado")
+                    return
+                portal.count('searches')
+                cufe = form.get("DocumentKey", [""])[0].strip()
+                clearance = portal.authorize(form.get("cf-turnstile-response", [""])[0],
+                                             self._clearance())
+                if clearance is None or not cufe:
+                    # Sin CAPTCHA resuelto el portal vuelve a mostrar la búsqueda
+                    self._send(303, "text/plain", b"", {"Location": "/User/SearchDocument"})
+                    return
+                token = portal.make_token(cufe)
+                location = f"/Document/ShowDocumentToPublic/{cufe}?Token={token}"
+                self._send(303, "text/plain", b"", {
+                    "Location": location,
+                    "Set-Cookie": f"clearance={clearance}; Path=/"
+                })
+
+        return Handler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m core.mock_portal',
+                                     description='Portal DIAN simulado para pruebas de rendimiento')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pdf-dir', default=DEFAULT_PDF_DIR,
+                        help='Carpeta con los PDFs que se sirven')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latencia media (s)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Variación de latencia (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fracción de solicitudes que responden 503')
+    parser.add_argument('--captcha-delay', type=float, default=1.0,
+                        help='Demora hasta que el CAPTCHA queda resuelto (s)')
+    parser.add_argument('--token-ttl', type=int, default=3600,
+                        help='Vigencia de los tokens emitidos (s)')
+    parser.add_argument('--clearance-uses', type=int, default=10,
+                        help='Búsquedas sin CAPTCHA que permite la cookie de autorización')
+    return parser
+
+
+def config_from_args(args):
+    return PortalConfig(pdf_dir=args.pdf_dir, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, captcha_delay=args.captcha_delay,
+                        token_ttl=args.token_ttl, clearance_uses=args.clearance_uses)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+    portal = MockPortal(config_from_args(args), args.host, args.port).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        portal.stop()
+        print(portal.stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
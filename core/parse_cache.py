@@ -0,0 +1,98 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from core.manifest import file_sha256
+
+PARSE_CACHE_FILE = "validacion_cache.sqlite"
+# Registros escritos antes de confirmar la transacción
+COMMIT_EVERY = 50
+
+
+class ParseCache:
+    """Caché persistente (SQLite) de los resultados de validación de PDFs.
+
+    La clave es el SHA-256 del contenido, el tipo de documento y la versión de
+    los procesadores (PROCESSOR_VERSION en pdf_processor): un archivo que
+    cambia se vuelve a procesar aunque conserve el nombre, y al subir la
+    versión se descartan los resultados anteriores.
+    """
+
+    def __init__(self, path=PARSE_CACHE_FILE, version=None):
+        if version is None:
+            from core.pdf_processor import PROCESSOR_VERSION
+            version = PROCESSOR_VERSION
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                sha256 TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                rows TEXT NOT NULL,
+                descuentos TEXT NOT NULL,
+                inventario TEXT NOT NULL,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (sha256, doc_type, version)
+            )
+        """)
+        self._conn.execute("DELETE FROM results WHERE version != ?", (version,))
+        self._conn.commit()
+
+    def key(self, filepath):
+        """Hash del contenido del archivo; None si no se puede leer"""
+        try:
+            return file_sha256(filepath)
+        except OSError as e:
+            logging.warning(f"No se pudo leer {filepath} para el caché: {str(e)}")
+            return None
+
+    def get(self, sha256, doc_type):
+        """Retorna el resultado guardado (rows, descuentos, inventario, error) o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rows, descuentos, inventario, error FROM results "
+                "WHERE sha256 = ? AND doc_type = ? AND version = ?",
+                (sha256, doc_type, self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {
+            'rows': json.loads(row[0]),
+            'descuentos': json.loads(row[1]),
+            'inventario': json.loads(row[2]),
+            'error': row[3]
+        }
+
+    def put(self, sha256, doc_type, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (sha256, doc_type, version, rows, descuentos, "
+                "inventario, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sha256, doc_type, self.version, json.dumps(result['rows']),
+                 json.dumps(result['descuentos']), json.dumps(result['inventario']),
+                 result['error'], time.time()))
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
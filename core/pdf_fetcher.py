@@ -0,0 +1,255 @@
+import os
+import queue
+import hashlib
+import logging
+import tempfile
+import threading
+import requests
+from contextlib import nullcontext
+from requests.adapters import HTTPAdapter
+from core.cancellation import Cancelled
+
+PORTAL_URL = "https://catalogo-vpfe.dian.gov.co"
+DOWNLOAD_PATH = "/Document/DownloadPDF?trackId={cufe}&token={token}"
+DOWNLOAD_URL = PORTAL_URL + DOWNLOAD_PATH
+
+# Descargas HTTP simultáneas por defecto
+DEFAULT_FETCH_CONCURRENCY = 4
+
+# Timeout de conexión y de lectura entre bloques (segundos)
+DOWNLOAD_TIMEOUT = (10, 60)
+# Espera máxima por los hilos de descarga al cerrar tras una cancelación
+CANCEL_JOIN_TIMEOUT = 0.5
+
+# Escritura por bloques y verificación de integridad
+CHUNK_SIZE = 64 * 1024
+PDF_HEADER = b"%PDF"
+PDF_EOF_MARKER = b"%%EOF"
+EOF_SEARCH_WINDOW = 2048
+
+
+class PdfIntegrityError(Exception):
+    """La respuesta descargada no es un PDF completo"""
+
+
+class PdfDownloadError(Exception):
+    """El portal no entregó el PDF (estado HTTP o contenido inválido)"""
+
+
+def build_pdf_path(folder_path, excel_path, cufe):
+    """Construye la ruta del PDF descargado para un CUFE"""
+    excel_name = os.path.splitext(os.path.basename(excel_path))[0]
+    return os.path.join(folder_path, f"{excel_name}_{cufe}.pdf")
+
+
+def create_http_session(pool_size=DEFAULT_FETCH_CONCURRENCY):
+    """Sesión HTTP que reutiliza conexiones TLS con el portal DIAN"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def save_pdf_stream(response, filepath, chunk_size=CHUNK_SIZE, cancel=None):
+    """Guarda un PDF de forma atómica a partir de una respuesta en streaming.
+
+    Escribe por bloques en un temporal de la misma carpeta, verifica la
+    cabecera %PDF, el marcador %%EOF y el Content-Length esperado, y solo
+    entonces lo renombra al destino. Retorna el SHA-256 del archivo. Si
+    cancel (CancelToken) se activa, borra el temporal y lanza Cancelled.
+    """
+    folder = os.path.dirname(filepath) or "."
+    # Con compresión, Content-Length no corresponde a los bytes decodificados
+    expected_length = None
+    if response.headers.get("Content-Encoding", "identity") == "identity":
+        expected_length = response.headers.get("Content-Length")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    tail = b""
+
+    fd, temp_path = tempfile.mkstemp(suffix=".part", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if cancel is not None:
+                    cancel.check()
+                if not chunk:
+                    continue
+                if len(head) < len(PDF_HEADER):
+                    head += chunk[:len(PDF_HEADER) - len(head)]
+                    if len(head) >= len(PDF_HEADER) and head != PDF_HEADER:
+                        raise PdfIntegrityError("La respuesta no es un PDF")
+                file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                tail = (tail + chunk)[-EOF_SEARCH_WINDOW:]
+            file.flush()
+            os.fsync(file.fileno())
+
+        if cancel is not None:
+            cancel.check()
+        if head != PDF_HEADER:
+            raise PdfIntegrityError("La respuesta no es un PDF")
+        if expected_length is not None and int(expected_length) != size:
+            raise PdfIntegrityError(f"PDF incompleto: {size} de {expected_length} bytes")
+        if PDF_EOF_MARKER not in tail:
+            raise PdfIntegrityError("PDF sin marcador %%EOF")
+
+        os.replace(temp_path, filepath)
+        return digest.hexdigest()
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def download_pdf(cufe, token, folder_path, excel_path, manifest=None, session=None,
+                 portal_url=PORTAL_URL, cancel=None):
+    """Descarga el PDF del CUFE con el token dado.
+
+    Lanza PdfDownloadError si el portal rechaza el token o el archivo llega
+    incompleto. Si cancel (CancelToken) se activa, cierra la respuesta y la
+    sesión HTTP en curso y lanza Cancelled sin dejar archivos a medias.
+    """
+    download_url = portal_url + DOWNLOAD_PATH.format(cufe=cufe, token=token)
+    if manifest:
+        manifest.mark_token(cufe, download_url)
+    filepath = build_pdf_path(folder_path, excel_path, cufe)
+    response = None
+
+    def interrupt():
+        # La sesión se cierra también para cortar la espera de las cabeceras
+        if response is not None:
+            response.close()
+        if session is not None:
+            session.close()
+
+    with (cancel.on_cancel(interrupt) if cancel else nullcontext()):
+        response = (session or requests).get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        with response:
+            status_code = response.status_code
+            if status_code == 200:
+                try:
+                    sha256 = save_pdf_stream(response, filepath, cancel=cancel)
+                except PdfIntegrityError as e:
+                    logging.error(f"PDF inválido para el CUFE {cufe}: {str(e)}")
+                    if manifest:
+                        manifest.mark_failed(cufe, str(e))
+                    raise PdfDownloadError(str(e)) from e
+
+    if status_code != 200:
+        logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe} "
+                      f"(HTTP {status_code})")
+        if manifest:
+            manifest.mark_failed(cufe, f"HTTP {status_code}")
+        raise PdfDownloadError(f"HTTP {status_code}")
+
+    logging.info(f"Archivo PDF descargado: {os.path.basename(filepath)}",
+                 extra={'cufe': cufe, 'file': filepath, 'stage': 'fetch'})
+    if manifest:
+        manifest.mark_downloaded(cufe, filepath, sha256)
+
+    with open(os.path.join(folder_path, "links_descarga.txt"), "a") as file:
+        file.write(f"{cufe}: {download_url}\n")
+    return True
+
+
+class PdfFetcher:
+    """Etapa de descarga de PDFs alimentada por una cola.
+
+    Un número fijo de hilos comparte una sesión HTTP con pool de conexiones,
+    de modo que el navegador puede pasar al siguiente CUFE mientras los PDFs
+    anteriores todavía se descargan. on_done(cufe, success, from_cache, error)
+    se llama desde los hilos de descarga al terminar cada trabajo. Si se
+    entrega un limiter (AimdLimiter), cada descarga espera su cupo y le
+    reporta el resultado; con metrics (StageMetrics) se registra la duración
+    de la espera y de la descarga. Con cancel (CancelToken) las descargas en
+    curso se interrumpen y las encoladas se descartan sin llamar a on_done.
+    """
+
+    def __init__(self, folder_path, excel_path, manifest=None,
+                 concurrency=DEFAULT_FETCH_CONCURRENCY, on_done=None, limiter=None,
+                 portal_url=PORTAL_URL, metrics=None, cancel=None):
+        self.folder_path = folder_path
+        self.excel_path = excel_path
+        self.manifest = manifest
+        self.concurrency = max(1, int(concurrency))
+        self.on_done = on_done
+        self.limiter = limiter
+        self.portal_url = portal_url
+        self.metrics = metrics
+        self.cancel = cancel
+        self.session = create_http_session(self.concurrency)
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._fetch_loop, name=f"dian-fetch-{i + 1}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, cufe, token, from_cache=False):
+        """Encola la descarga del PDF de un CUFE"""
+        self._queue.put((cufe, token, from_cache))
+
+    def close(self):
+        """Espera a que terminen las descargas encoladas y libera la sesión.
+
+        Si se canceló, no espera más de CANCEL_JOIN_TIMEOUT por los hilos: al
+        cerrar la sesión se cortan las conexiones que siguen abiertas.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        timeout = CANCEL_JOIN_TIMEOUT if self._cancelled() else None
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.session.close()
+
+    def _cancelled(self):
+        return self.cancel is not None and self.cancel.cancelled
+
+    def _active(self):
+        return not self._cancelled()
+
+    def _stage(self, cufe, name):
+        return self.metrics.stage(cufe, name) if self.metrics else nullcontext()
+
+    def _fetch_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            cufe, token, from_cache = job
+            if self._cancelled():
+                continue
+            error = None
+            with self._stage(cufe, 'fetch_wait'):
+                started = self.limiter.acquire(self._active) if self.limiter else None
+            if self.limiter and started is None:
+                continue
+            try:
+                with self._stage(cufe, 'fetch'):
+                    download_pdf(cufe, token, self.folder_path, self.excel_path,
+                                 self.manifest, self.session, self.portal_url, self.cancel)
+            except Cancelled:
+                # El CUFE queda con el token registrado y se retoma en la próxima corrida
+                logging.info(f"Descarga del CUFE {cufe} interrumpida")
+                if self.limiter:
+                    self.limiter.abandon()
+                continue
+            except PdfDownloadError as e:
+                error = e
+            except Exception as e:
+                logging.error(f"Error descargando PDF del CUFE {cufe}: {str(e)}")
+                if self.manifest:
+                    self.manifest.mark_failed(cufe, str(e))
+                error = e
+            if self.limiter:
+                self.limiter.release(started, error is None)
+            if self.on_done:
+                self.on_done(cufe, error is None, from_cache, error)
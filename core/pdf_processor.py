@@ -1,8 +1,10 @@
 # Importaciones estándar
 import os
 import re
+import logging
 import pandas as pd
 from collections import defaultdict
+from contextlib import contextmanager
 
 # Importaciones para PDF
 import pdfplumber
@@ -30,6 +32,9 @@ from PyQt5.QtCore import Qt
 
 
 # Constantes y configuración global
+# Subir al cambiar lo que extraen los procesadores: invalida el caché de validación
+PROCESSOR_VERSION = 3
+
 COLUMN_HEADERS = {
    "A": "Razón Social",
     "B": "Tipo Documento",
@@ -58,6 +63,70 @@ COLUMN_HEADERS = {
 }
 
 
+class ParsedDocument:
+    """PDF abierto una sola vez para todos los procesadores.
+
+    El texto y las tablas de cada página se extraen la primera vez que se
+    piden y se reutilizan, así procesar una factura de compra y su inventario
+    no vuelve a abrir ni a recorrer el archivo.
+    """
+
+    def __init__(self, pdf_path):
+        self.path = pdf_path
+        self._pdf = pdfplumber.open(pdf_path)
+        self.page_count = len(self._pdf.pages)
+        self._texts = {}
+        self._tables = {}
+        self._rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._pdf.close()
+
+    def page_text(self, index):
+        """Texto de la página index"""
+        if index not in self._texts:
+            self._texts[index] = self._pdf.pages[index].extract_text() or ""
+        return self._texts[index]
+
+    @property
+    def first_page_text(self):
+        return self.page_text(0)
+
+    def page_tables(self, index):
+        """Tablas de la página index"""
+        if index not in self._tables:
+            self._tables[index] = self._pdf.pages[index].extract_tables()
+        return self._tables[index]
+
+    def table_rows(self):
+        """Filas de todas las tablas del documento con las celdas como texto limpio"""
+        if self._rows is None:
+            self._rows = [
+                [str(cell).strip() if cell is not None else '' for cell in row]
+                for index in range(self.page_count)
+                for table in self.page_tables(index)
+                for row in table
+                if row
+            ]
+        return self._rows
+
+
+@contextmanager
+def open_document(source):
+    """Entrega un ParsedDocument para una ruta, o el mismo si ya viene abierto"""
+    if isinstance(source, ParsedDocument):
+        yield source
+    else:
+        with ParsedDocument(source) as document:
+            yield document
+
+
 def get_invoice_type(filename, pdf_path, user_selected_type, prefijo_venta):
     """Determina el tipo de factura basado en la selección del usuario"""
     # Mapear tipos de documento con sus códigos internos
@@ -76,15 +145,15 @@ def get_invoice_type(filename, pdf_path, user_selected_type, prefijo_venta):
 def get_document_type(filepath):
     """Determina el tipo de documento basado en el contenido del archivo"""
     try:
-        with pdfplumber.open(filepath) as pdf:
-            text = pdf.pages[0].extract_text()
+        with open_document(filepath) as document:
+            text = document.first_page_text
             
             # Verificar el tipo de documento basado en el texto
             if "Factura Electrónica de Venta" in text:
                 return "Factura de Venta"
-            elif "Nota Crédito de la Factura Electrónica" in text:
+            elif NOTA_CREDITO_MARKER in text:
                 return "Nota Crédito"
-            elif "Nota Débito de la Factura Electrónica" in text:
+            elif NOTA_DEBITO_MARKER in text:
                 return "Nota Débito"
             elif "Factura de Compra Electrónica" in text:
                 return "Factura de Compra"
@@ -97,7 +166,7 @@ def get_document_type(filepath):
             return None
             
     except Exception as e:
-        print(f"Error determinando tipo de documento: {str(e)}")
+        logging.error(f"Error determinando tipo de documento: {str(e)}")
         return None
 
 # Funciones auxiliares
@@ -154,7 +223,7 @@ def parse_colombian_number(text):
         else:
             return float(clean_text.replace('.', ''))
     except (ValueError, AttributeError):
-        print(f"No se pudo convertir el valor: '{text}'")
+        logging.warning(f"No se pudo convertir el valor: '{text}'")
         return 0.0
         
 
@@ -174,59 +243,170 @@ def extract_field(text, start_marker, end_marker):
     except Exception:
         return ""
 
-def extract_total_impuestos(pdf):
-    """Extrae los impuestos totales del documento"""
-    impuestos = {
-        'Total IVA': 0.00,
-        'Total INC': 0.00,
-        'Total Bolsas': 0.00,
-        'IBUA': 0.00,
-        'ICUI': 0.00,  # Agregado ICUI
-        'Otros Impuestos': 0.00,
-        'Rete Fuente': 0.00,
-        'Rete IVA': 0.00,
-        'Rete ICA': 0.00
-    }
+# Marcadores del encabezado (primera página): (marcador inicial, marcador final)
+RAZON_SOCIAL = ("Razón Social:", "Nombre Comercial:")
+NOMBRE_COMPRADOR = ("Nombre o Razón Social:", "Tipo de Documento:")
+NIT_EMISOR = ("Nit del Emisor:", "País:")
+FECHA_EMISION = ("Fecha de Emisión:", "Medio de Pago:")
+NUMERO_FACTURA = ("Número de Factura:", "Forma de pago:")
+
+# Marcadores del tipo de documento en la primera página
+NOTA_CREDITO_MARKER = "Nota Crédito de la Factura Electrónica"
+NOTA_DEBITO_MARKER = "Nota Débito de la Factura Electrónica"
+# Factura que corrige una nota, en la sección "Referencias":
+# "Factura Electrónica <número> <fecha>"
+FACTURA_REFERENCIA = r'^Factura Electrónica (\S+)'
+
+# Campos comunes a todos los documentos; cada especificación elige el emisor
+HEADER_FIELDS = {
+    'numero_documento': NIT_EMISOR,
+    'fecha_emision': FECHA_EMISION,
+    'numero_factura': NUMERO_FACTURA
+}
+
+# Totales de la sección "Datos Totales": campo -> etiqueta. El valor es el
+# primer monto que sigue a la etiqueta, sin distinguir mayúsculas.
+TOTAL_LABELS = {
+    'Total IVA': 'IVA',
+    'Total INC': 'INC',
+    'Total Bolsas': 'Bolsas',
+    'IBUA': 'IBUA',
+    'ICUI': 'ICUI',
+    'Otros Impuestos': 'Otros impuestos',
+    'Rete Fuente': 'Rete fuente',
+    'Rete IVA': 'Rete IVA',
+    'Rete ICA': 'Rete ICA'
+}
+AMOUNT_PATTERN = r'\s*[\$\s]*([0-9.,]+)'
+
+
+class FieldExtractor:
+    """Extractor de campos compilado una vez a partir de su especificación.
+
+    markers es {campo: (marcador inicial, marcador final)} y cada campo se
+    extrae como en extract_field. patterns es {campo: regex con un grupo}
+    (multilínea); el campo es el grupo de la primera coincidencia o "".
+    amounts es {campo: etiqueta}: el valor es el primer monto que sigue a la
+    etiqueta, convertido con parser. Las etiquetas se buscan con str.find
+    sobre el texto en minúsculas y el monto con una sola expresión
+    precompilada, en lugar de una regex por campo.
+    """
+
+    def __init__(self, markers=None, amounts=None, parser=None, amount_pattern=AMOUNT_PATTERN,
+                 patterns=None):
+        self.markers = [(name, start, end, len(start))
+                        for name, (start, end) in (markers or {}).items()]
+        self.patterns = [(name, re.compile(pattern, re.MULTILINE))
+                         for name, pattern in (patterns or {}).items()]
+        self.amounts = [(name, label.lower(), len(label),
+                         re.compile(re.escape(label) + amount_pattern, re.IGNORECASE))
+                        for name, label in (amounts or {}).items()]
+        self.parser = parser or parse_colombian_number
+        self._amount = re.compile(amount_pattern)
+
+    def extract(self, text):
+        """Retorna {campo: valor}; los montos no encontrados se omiten"""
+        values = {}
+        for name, start_marker, end_marker, size in self.markers:
+            start_index = text.find(start_marker)
+            if start_index == -1:
+                values[name] = ""
+                continue
+            start_index += size
+            end_index = text.find(end_marker, start_index)
+            values[name] = (text[start_index:] if end_index == -1
+                            else text[start_index:end_index]).strip()
+        for name, pattern in self.patterns:
+            match = pattern.search(text)
+            values[name] = match.group(1).strip() if match else ""
+        if self.amounts:
+            values.update(self._extract_amounts(text))
+        return values
+
+    def _extract_amounts(self, text):
+        lowered = text.lower()
+        # Si algún carácter cambia de largo al pasar a minúsculas las
+        # posiciones no coinciden y se usa la expresión completa
+        aligned = len(lowered) == len(text)
+        values = {}
+        for name, label, size, pattern in self.amounts:
+            match = None
+            if aligned:
+                index = lowered.find(label)
+                while index != -1:
+                    match = self._amount.match(text, index + size)
+                    if match:
+                        break
+                    index = lowered.find(label, index + 1)
+            else:
+                match = pattern.search(text)
+            if match:
+                valor_str = match.group(1).strip()
+                try:
+                    values[name] = self.parser(valor_str)
+                except Exception as e:
+                    logging.error(f"Error convirtiendo valor para {name}: {valor_str} - {str(e)}")
+        return values
+
+
+class DocumentSpec:
+    """Especificación de un tipo de documento para process_document.
+
+    fields son los marcadores del encabezado (emisor, numero_documento,
+    fecha_emision y numero_factura) y patterns otros campos por regex; con
+    descuentos se suman también los descuentos de detalle y el IVA asumido
+    de los ítems. Con marker, el documento solo se procesa si su primera
+    página lo contiene.
+    """
+
+    def __init__(self, tipo_documento, fields, descuentos=False, marker=None, patterns=None):
+        self.tipo_documento = tipo_documento
+        self.descuentos = descuentos
+        self.marker = marker
+        self.header = FieldExtractor(markers=fields, patterns=patterns)
+
+
+TOTALES = FieldExtractor(amounts=TOTAL_LABELS)
+INVENTORY_HEADER = FieldExtractor(markers={'nit_emisor': NIT_EMISOR,
+                                           'numero_factura': NUMERO_FACTURA})
+
+FACTURA_VENTA = DocumentSpec("Factura de Venta", dict(HEADER_FIELDS, emisor=RAZON_SOCIAL))
+FACTURA_COMPRA = DocumentSpec("Factura de Compra", dict(HEADER_FIELDS, emisor=NOMBRE_COMPRADOR),
+                              descuentos=True)
+# Las notas se exportan con las mismas columnas que las facturas de venta; la
+# factura que corrigen queda en el encabezado extraído como factura_referencia
+NOTA_CREDITO = DocumentSpec("Nota Crédito", dict(HEADER_FIELDS, emisor=RAZON_SOCIAL),
+                            marker=NOTA_CREDITO_MARKER,
+                            patterns={'factura_referencia': FACTURA_REFERENCIA})
+NOTA_DEBITO = DocumentSpec("Nota Débito", dict(HEADER_FIELDS, emisor=RAZON_SOCIAL),
+                           marker=NOTA_DEBITO_MARKER,
+                           patterns={'factura_referencia': FACTURA_REFERENCIA})
+FACTURAS_COMPRAS_NUEVOS = DocumentSpec("Facturas de Compras Nuevos",
+                                       dict(HEADER_FIELDS, emisor=NOMBRE_COMPRADOR))
+FACTURAS_GASTOS = DocumentSpec("Facturas de Gastos", dict(HEADER_FIELDS, emisor=NOMBRE_COMPRADOR))
+
+def extract_total_impuestos(document):
+    """Extrae los impuestos totales del documento (ParsedDocument)"""
+    impuestos = {name: 0.00 for name in TOTAL_LABELS}
     
     try:
         datos_totales_text = ""
-        for page in pdf.pages:
-            text = page.extract_text()
+        for index in range(document.page_count):
+            text = document.page_text(index)
             if "Datos Totales" in text:
                 datos_totales_text = text[text.find("Datos Totales"):]
                 break
         
         if datos_totales_text:
-            patrones = {
-                'Total IVA': [r'IVA\s*[\$\s]*([0-9.,]+)'],
-                'Total INC': [r'INC\s*[\$\s]*([0-9.,]+)'],
-                'Total Bolsas': [r'Bolsas\s*[\$\s]*([0-9.,]+)'],
-                'IBUA': [r'IBUA\s*[\$\s]*([0-9.,]+)'],
-                'ICUI': [r'ICUI\s*[\$\s]*([0-9.,]+)'],  # Patrón específico para ICUI
-                'Otros Impuestos': [r'Otros impuestos\s*[\$\s]*([0-9.,]+)'],
-                'Rete Fuente': [r'Rete fuente\s*[\$\s]*([0-9.,]+)'],
-                'Rete IVA': [r'Rete IVA\s*[\$\s]*([0-9.,]+)'],
-                'Rete ICA': [r'Rete ICA\s*[\$\s]*([0-9.,]+)']
-            }
-            
-            for impuesto, lista_patrones in patrones.items():
-                for patron in lista_patrones:
-                    match = re.search(patron, datos_totales_text, re.IGNORECASE)  # Agregado IGNORECASE
-                    if match:
-                        valor_str = match.group(1).strip()
-                        try:
-                            valor = parse_colombian_number(valor_str)
-                            impuestos[impuesto] = valor
-                            break
-                        except Exception as e:
-                            print(f"Error convirtiendo valor para {impuesto}: {valor_str} - {str(e)}")
+            impuestos.update(TOTALES.extract(datos_totales_text))
                             
-            # Debug: imprimir el texto encontrado
-            print("Datos Totales encontrados:", datos_totales_text)
-            print("Impuestos extraídos:", impuestos)
+            # El volcado del texto solo se arma con el nivel DEBUG activo
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"Datos Totales encontrados: {datos_totales_text}")
+                logging.debug(f"Impuestos extraídos: {impuestos}")
             
     except Exception as e:
-        print(f"Error extrayendo impuestos: {str(e)}")
+        logging.error(f"Error extrayendo impuestos: {str(e)}")
     
     return impuestos
 
@@ -263,112 +443,66 @@ def create_base_row(emisor, tipo_documento, numero_documento, fecha_emision, num
 
     
 # Funciones de procesamiento principales
-def process_factura_venta(pdf_path):
-    """Procesa una factura de venta"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page = pdf.pages[0]
-            text = first_page.extract_text()
-            
-            emisor = extract_field(text, "Razón Social:", "Nombre Comercial:")
-            numero_documento = extract_field(text, "Nit del Emisor:", "País:")
-            fecha_emision = extract_field(text, "Fecha de Emisión:", "Medio de Pago:")
-            numero_factura = extract_field(text, "Número de Factura:", "Forma de pago:")
-            
-            impuestos = extract_total_impuestos(pdf)
-            
-            sumas_por_iva = defaultdict(float)
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        if not row or len(row) < 10:
-                            continue
-                        row = [str(cell).strip() if cell is not None else '' for cell in row]
-                        if row[0].strip().isdigit():
-                            try:
-                                precio_unitario = parse_colombian_number(row[5])
-                                iva_percent = float(row[9].replace(',', '.'))
-                                sumas_por_iva[iva_percent] += precio_unitario
-                            except Exception as e:
-                                print(f"Error procesando fila: {str(e)}")
-                                continue
-            
-            rows = []
-            for iva_percent, base_iva in sumas_por_iva.items():
-                row = create_base_row(
-                    emisor=emisor,
-                    tipo_documento="Factura de Venta",
-                    numero_documento=numero_documento,
-                    fecha_emision=fecha_emision,
-                    numero_factura=numero_factura,
-                    iva_percent=iva_percent,
-                    base_iva=base_iva,
-                    impuestos=impuestos
-                )
-                rows.append(row)
-            
-            return rows
-            
-    except Exception as e:
-        print(f"Error procesando factura de venta: {str(e)}")
-        return None
+def sum_items(document, spec):
+    """Suma el precio de los ítems por porcentaje de IVA.
 
-def process_factura_compra(pdf_path):
-    """Procesa una factura de compra"""
+    Retorna (sumas por IVA, valor del descuento); el descuento es None si
+    la especificación no los incluye o el documento no tiene.
+    """
+    sumas_por_iva = defaultdict(float)
+    suma_descuentos_detalle = 0
+    iva_asumido = 0
+    tiene_descuento = False
+    
+    for row in document.table_rows():
+        if len(row) < 10:
+            continue
+        if row[0].strip().isdigit():
+            try:
+                precio_unitario = parse_colombian_number(row[5])
+                iva_percent = float(row[9].replace(',', '.'))
+                descuento = parse_colombian_number(row[6]) if spec.descuentos and row[6] else 0
+                
+                sumas_por_iva[iva_percent] += precio_unitario
+                if descuento > 0:
+                    suma_descuentos_detalle += descuento
+                    tiene_descuento = True
+                    
+            except Exception as e:
+                logging.error(f"Error procesando fila: {str(e)}")
+                continue
+        elif spec.descuentos and len(row) >= 4 and "IVA ASUMIDO" in str(row[3]):
+            try:
+                iva_asumido = parse_colombian_number(row[5])
+                tiene_descuento = True
+            except Exception as e:
+                logging.error(f"Error procesando IVA ASUMIDO: {str(e)}")
+    
+    if not tiene_descuento:
+        return sumas_por_iva, None
+    return sumas_por_iva, suma_descuentos_detalle if suma_descuentos_detalle > 0 else iva_asumido
+
+def process_document(pdf_path, spec):
+    """Procesa un documento según su especificación; retorna (filas, filas de descuento)"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page = pdf.pages[0]
-            text = first_page.extract_text()
-            
-            nombre_comprador = extract_field(text, "Nombre o Razón Social:", "Tipo de Documento:")
-            numero_documento = extract_field(text, "Nit del Emisor:", "País:")
-            fecha_emision = extract_field(text, "Fecha de Emisión:", "Medio de Pago:")
-            numero_factura = extract_field(text, "Número de Factura:", "Forma de pago:")
-            
-            impuestos = extract_total_impuestos(pdf)
-            
-            sumas_por_iva = defaultdict(float)
-            suma_descuentos_detalle = 0
-            iva_asumido = 0
-            tiene_descuento = False
-            
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        if not row or len(row) < 10:
-                            continue
-                        row = [str(cell).strip() if cell is not None else '' for cell in row]
-                        if row[0].strip().isdigit():
-                            try:
-                                precio_unitario = parse_colombian_number(row[5])
-                                iva_percent = float(row[9].replace(',', '.'))
-                                descuento = parse_colombian_number(row[6]) if row[6] else 0
-                                
-                                sumas_por_iva[iva_percent] += precio_unitario
-                                if descuento > 0:
-                                    suma_descuentos_detalle += descuento
-                                    tiene_descuento = True
-                                    
-                            except Exception as e:
-                                print(f"Error procesando fila: {str(e)}")
-                                continue
-                        elif len(row) >= 4 and "IVA ASUMIDO" in str(row[3]):
-                            try:
-                                iva_asumido = parse_colombian_number(row[5])
-                                tiene_descuento = True
-                            except Exception as e:
-                                print(f"Error procesando IVA ASUMIDO: {str(e)}")
+        with open_document(pdf_path) as document:
+            text = document.first_page_text
+            if spec.marker and spec.marker not in text:
+                logging.warning(f"{os.path.basename(document.path)} no es un documento "
+                                f"de tipo {spec.tipo_documento}")
+                return [], []
+            header = spec.header.extract(text)
+            impuestos = extract_total_impuestos(document)
+            sumas_por_iva, valor_descuento = sum_items(document, spec)
             
             rows = []
             for iva_percent, base_iva in sumas_por_iva.items():
                 row = create_base_row(
-                    emisor=nombre_comprador,
-                    tipo_documento="Factura de Compra",
-                    numero_documento=numero_documento,
-                    fecha_emision=fecha_emision,
-                    numero_factura=numero_factura,
+                    emisor=header['emisor'],
+                    tipo_documento=spec.tipo_documento,
+                    numero_documento=header['numero_documento'],
+                    fecha_emision=header['fecha_emision'],
+                    numero_factura=header['numero_factura'],
                     iva_percent=iva_percent,
                     base_iva=base_iva,
                     impuestos=impuestos
@@ -377,14 +511,13 @@ def process_factura_compra(pdf_path):
             
             # Procesar descuentos si existen
             descuento_rows = []
-            if tiene_descuento:
-                valor_descuento = suma_descuentos_detalle if suma_descuentos_detalle > 0 else iva_asumido
+            if valor_descuento is not None:
                 descuento_row = create_base_row(
-                    emisor=nombre_comprador,
-                    tipo_documento="Factura de Compra",
-                    numero_documento=numero_documento,
-                    fecha_emision=fecha_emision,
-                    numero_factura=numero_factura,
+                    emisor=header['emisor'],
+                    tipo_documento=spec.tipo_documento,
+                    numero_documento=header['numero_documento'],
+                    fecha_emision=header['fecha_emision'],
+                    numero_factura=header['numero_factura'],
                     iva_percent=0,
                     base_iva=valor_descuento,
                     impuestos=impuestos
@@ -399,146 +532,80 @@ def process_factura_compra(pdf_path):
             return rows, descuento_rows
             
     except Exception as e:
-        print(f"Error procesando factura de compra: {str(e)}")
+        logging.error(f"Error procesando {spec.tipo_documento.lower()}: {str(e)}")
         return None, []
 
-# Funciones similares para los otros tipos de documentos
+def process_factura_venta(pdf_path):
+    """Procesa una factura de venta"""
+    rows, _ = process_document(pdf_path, FACTURA_VENTA)
+    return rows
+
+def process_factura_compra(pdf_path):
+    """Procesa una factura de compra; retorna (filas, filas de descuento)"""
+    return process_document(pdf_path, FACTURA_COMPRA)
+
 def process_nota_credito(pdf_path):
     """Procesa una nota crédito"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Lógica similar a process_factura_venta pero con tipo_documento="Nota Crédito"
-            # ...
-            pass
-    except Exception as e:
-        print(f"Error procesando nota crédito: {str(e)}")
-        return None
+    rows, _ = process_document(pdf_path, NOTA_CREDITO)
+    return rows
 
 def process_nota_debito(pdf_path):
     """Procesa una nota débito"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Lógica similar a process_factura_venta pero con tipo_documento="Nota Débito"
-            # ...
-            pass
-    except Exception as e:
-        print(f"Error procesando nota débito: {str(e)}")
-        return None
+    rows, _ = process_document(pdf_path, NOTA_DEBITO)
+    return rows
 
 def process_facturas_compras_nuevos(pdf_path):
     """Procesa una factura de compras nuevos"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Lógica similar a process_factura_compra
-            # ...
-            pass
-    except Exception as e:
-        print(f"Error procesando facturas de compras nuevos: {str(e)}")
-        return None
-
+    rows, _ = process_document(pdf_path, FACTURAS_COMPRAS_NUEVOS)
+    return rows
 
 def process_facturas_gastos(pdf_path):
     """Procesa una factura de gastos"""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page = pdf.pages[0]
-            text = first_page.extract_text()
-            
-            nombre_comprador = extract_field(text, "Nombre o Razón Social:", "Tipo de Documento:")
-            numero_documento = extract_field(text, "Nit del Emisor:", "País:")
-            fecha_emision = extract_field(text, "Fecha de Emisión:", "Medio de Pago:")
-            numero_factura = extract_field(text, "Número de Factura:", "Forma de pago:")
-            
-            impuestos = extract_total_impuestos(pdf)
-            
-            sumas_por_iva = defaultdict(float)
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        if not row or len(row) < 10:
-                            continue
-                        row = [str(cell).strip() if cell is not None else '' for cell in row]
-                        if row[0].strip().isdigit():
-                            try:
-                                precio_unitario = parse_colombian_number(row[5])
-                                iva_percent = float(row[9].replace(',', '.'))
-                                sumas_por_iva[iva_percent] += precio_unitario
-                            except Exception as e:
-                                print(f"Error procesando fila: {str(e)}")
-                                continue
-            
-            rows = []
-            for iva_percent, base_iva in sumas_por_iva.items():
-                row = create_base_row(
-                    emisor=nombre_comprador,
-                    tipo_documento="Facturas de Gastos",
-                    numero_documento=numero_documento,
-                    fecha_emision=fecha_emision,
-                    numero_factura=numero_factura,
-                    iva_percent=iva_percent,
-                    base_iva=base_iva,
-                    impuestos=impuestos
-                )
-                rows.append(row)
-            
-            return rows
-            
-    except Exception as e:
-        print(f"Error procesando facturas de gastos: {str(e)}")
-        return None
+    rows, _ = process_document(pdf_path, FACTURAS_GASTOS)
+    return rows
 
 def process_inventory(pdf_path):
     """Procesa el inventario de un documento PDF"""
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            first_page = pdf.pages[0]
-            text = first_page.extract_text()
-            
-            nit_emisor = extract_field(text, "Nit del Emisor:", "País:")
-            numero_factura = extract_field(text, "Número de Factura:", "Forma de pago:")
+        with open_document(pdf_path) as document:
+            header = INVENTORY_HEADER.extract(document.first_page_text)
+            nit_emisor = header['nit_emisor']
+            numero_factura = header['numero_factura']
             
             inventory_items = []
             
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                
-                for table in tables:
-                    for row in table:
-                        if not row or len(row) < 11:
-                            continue
-                            
-                        row = [str(cell).strip() if cell is not None else '' for cell in row]
-                        
-                        if row[0].strip().isdigit():
-                            try:
-                                item = {
-                                    "nit_emisor": nit_emisor,
-                                    "numero_factura": numero_factura,
-                                    "Nro": row[0],
-                                    "Codigo": row[1],
-                                    "Descripcion": row[2],
-                                    "U/M": row[3],
-                                    "Cantidad": parse_colombian_number(row[4]),
-                                    "Precio_unitario": parse_colombian_number(row[5].replace('$', '')),
-                                    "Descuento": parse_colombian_number(row[6].replace('$', '')),
-                                    "Recargo": parse_colombian_number(row[7].replace('$', '')),
-                                    "IVA": parse_colombian_number(row[8].replace('$', '')),
-                                    "Porcentaje_IVA": float(row[9].replace('%', '').strip() or '0'),
-                                    "INC": parse_colombian_number(row[10].replace('$', '')),
-                                    "Porcentaje_INC": float(row[11].replace('%', '').strip() or '0'),
-                                    "Precio_venta": parse_colombian_number(row[12].replace('$', ''))
-                                }
-                                inventory_items.append(item)
-                            except Exception as e:
-                                print(f"Error procesando línea de inventario: {row}")
-                                print(f"Error: {str(e)}")
-                                continue
+            for row in document.table_rows():
+                if len(row) < 11:
+                    continue
+                if row[0].strip().isdigit():
+                    try:
+                        item = {
+                            "nit_emisor": nit_emisor,
+                            "numero_factura": numero_factura,
+                            "Nro": row[0],
+                            "Codigo": row[1],
+                            "Descripcion": row[2],
+                            "U/M": row[3],
+                            "Cantidad": parse_colombian_number(row[4]),
+                            "Precio_unitario": parse_colombian_number(row[5].replace('$', '')),
+                            "Descuento": parse_colombian_number(row[6].replace('$', '')),
+                            "Recargo": parse_colombian_number(row[7].replace('$', '')),
+                            "IVA": parse_colombian_number(row[8].replace('$', '')),
+                            "Porcentaje_IVA": float(row[9].replace('%', '').strip() or '0'),
+                            "INC": parse_colombian_number(row[10].replace('$', '')),
+                            "Porcentaje_INC": float(row[11].replace('%', '').strip() or '0'),
+                            "Precio_venta": parse_colombian_number(row[12].replace('$', ''))
+                        }
+                        inventory_items.append(item)
+                    except Exception as e:
+                        logging.error(f"Error procesando línea de inventario: {row}")
+                        logging.error(f"Error: {str(e)}")
+                        continue
             
             return inventory_items
             
     except Exception as e:
-        print(f"Error procesando inventario: {str(e)}")
+        logging.error(f"Error procesando inventario: {str(e)}")
         return None
 
 class ValidatorTab(QWidget):
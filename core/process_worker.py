@@ -0,0 +1,187 @@
+import time
+import queue
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler
+from core.waits import WaitTimeout
+from core.cancellation import Cancelled
+
+# Un proceso que no da señales de vida en este tiempo se considera colgado.
+# Debe superar el timeout máximo de una etapa (60 s) y el arranque de Chrome.
+HEARTBEAT_TIMEOUT = 120.0
+STARTUP_TIMEOUT = 180.0
+# Cada cuánto se revisan el latido y la cancelación mientras el hijo trabaja
+RESULT_POLL_INTERVAL = 0.2
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class WorkerLost(Exception):
+    """El proceso de captura murió o dejó de responder y fue terminado"""
+
+
+def _error_payload(error):
+    payload = {'type': type(error).__name__, 'message': str(error)}
+    if isinstance(error, WaitTimeout):
+        payload['stage'] = error.stage
+        payload['timeout'] = error.timeout
+    return payload
+
+
+def _rebuild_error(payload):
+    """Reconstruye en el padre la excepción del hijo, conservando WaitTimeout"""
+    if payload['type'] == 'WaitTimeout':
+        return WaitTimeout(payload['stage'], payload['timeout'])
+    return RuntimeError(f"{payload['type']}: {payload['message']}")
+
+
+def _worker_main(worker_id, factory, tasks, results):
+    """Bucle del proceso hijo: un navegador propio y un CUFE a la vez"""
+    from core.http_search import SearchHandoff
+    from core.metrics import StageTimings
+
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(results)]
+    root.setLevel(logging.INFO)
+
+    def heartbeat():
+        results.put(('heartbeat', worker_id, None))
+
+    with factory() as sb:
+        search = SearchHandoff(sb)
+        results.put(('ready', worker_id, None))
+        while True:
+            job = tasks.get()
+            if job is None:
+                return
+            cufe, search_url, http_search, reuse_page = job
+            timings = StageTimings(on_stage=heartbeat)
+            try:
+                url = search.capture(cufe, search_url, timings, http_search, reuse_page)
+                results.put(('done', worker_id, (url, None, timings.entries)))
+            except Exception as e:
+                results.put(('done', worker_id, (None, _error_payload(e), timings.entries)))
+
+            try:
+                sb.execute_script("return 1")
+            except Exception:
+                # El navegador murió: el padre verá el proceso terminado y lo reemplaza
+                return
+
+
+class CaptureProcess:
+    """Sesión de captura aislada en un proceso hijo con su propio navegador.
+
+    Tiene la misma interfaz que BrowserSession. El padre actúa como watchdog:
+    si el hijo muere o pasa HEARTBEAT_TIMEOUT sin enviar latidos ni logs, lo
+    termina y capture() lanza WorkerLost para que el CUFE se vuelva a encolar.
+    """
+
+    def __init__(self, session_id, factory, heartbeat_timeout=None):
+        self.id = session_id
+        self.documents = 0
+        self.heartbeat_timeout = heartbeat_timeout or HEARTBEAT_TIMEOUT
+        self._lost = False
+        # spawn evita heredar hilos, locks y el estado de Qt del proceso padre
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self.process = context.Process(target=_worker_main,
+                                       args=(session_id, factory, self._tasks, self._results),
+                                       name=f"dian-capture-{session_id}", daemon=True)
+        self.process.start()
+        try:
+            self._wait_for('ready', STARTUP_TIMEOUT)
+        except WorkerLost:
+            self.close()
+            raise
+
+    def _wait_for(self, kind, timeout, cancel=None):
+        """Lee mensajes del hijo hasta recibir kind; reenvía sus logs al padre.
+
+        Si se cancela mientras espera, termina el hijo y lanza Cancelled.
+        """
+        last_beat = time.monotonic()
+        while True:
+            if cancel is not None and cancel.cancelled:
+                self.kill()
+                raise Cancelled(f"Captura en el proceso {self.id} detenida")
+            try:
+                message = self._results.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                message = None
+            if message is not None:
+                # Cualquier mensaje del hijo, también sus logs, prueba que sigue vivo
+                last_beat = time.monotonic()
+                if isinstance(message, logging.LogRecord):
+                    logging.getLogger().handle(message)
+                    continue
+                if message[0] == kind:
+                    return message[2]
+                continue
+            if not self.process.is_alive():
+                self._lost = True
+                raise WorkerLost(f"El proceso de captura {self.id} terminó "
+                                 f"(código {self.process.exitcode})")
+            if time.monotonic() - last_beat > timeout:
+                logging.error(f"Proceso de captura {self.id} sin latido por {timeout:.0f}s, "
+                              f"terminándolo")
+                self.kill()
+                raise WorkerLost(f"El proceso de captura {self.id} dejó de responder")
+
+    def capture(self, cufe, search_url, metrics=None, http_search=False, reuse_page=False,
+                cancel=None):
+        """Captura el token del CUFE en el proceso hijo y retorna la URL"""
+        if self._lost:
+            raise WorkerLost(f"El proceso de captura {self.id} no está disponible")
+        self._tasks.put((cufe, search_url, http_search, reuse_page))
+        url, error, entries = self._wait_for('done', self.heartbeat_timeout, cancel)
+        if metrics:
+            for stage, seconds, outcome in entries:
+                metrics.record(cufe, stage, seconds, outcome)
+        if error:
+            raise _rebuild_error(error)
+        return url
+
+    def alive(self):
+        return not self._lost and self.process.is_alive()
+
+    def memory_mb(self):
+        """Memoria del proceso hijo y su Chrome en MB; None sin psutil"""
+        try:
+            import psutil
+        except ImportError:
+            return None
+        try:
+            process = psutil.Process(self.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def heap_mb(self):
+        return None
+
+    def kill(self):
+        """Termina el hijo y, si psutil está instalado, también su Chrome"""
+        self._lost = True
+        children = []
+        try:
+            import psutil
+            children = psutil.Process(self.process.pid).children(recursive=True)
+        except Exception:
+            pass
+        for child in children:
+            try:
+                child.kill()
+            except Exception:
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(SHUTDOWN_TIMEOUT)
+
+    def close(self):
+        if self.process.is_alive() and not self._lost:
+            self._tasks.put(None)
+            self.process.join(SHUTDOWN_TIMEOUT)
+        if self.process.is_alive():
+            self.kill()
@@ -0,0 +1,125 @@
+import time
+import logging
+import threading
+
+# Tolerancia de latencia: por encima de este múltiplo de la mejor latencia
+# observada se deja de aumentar el límite
+LATENCY_TOLERANCE = 3.0
+# Tiempo mínimo entre dos recortes del límite, para no encadenar recortes
+# por fallas de solicitudes que ya estaban en vuelo
+DECREASE_COOLDOWN = 5.0
+EWMA_ALPHA = 0.2
+
+
+class AimdLimiter:
+    """Límite de solicitudes en vuelo y de ritmo con retroalimentación AIMD.
+
+    Cada éxito con latencia sana suma increase / limit al límite (crecimiento
+    aditivo de una unidad por "ventana"); cada falla lo multiplica por
+    decrease. El ritmo (solicitudes por segundo) se ajusta de la misma forma.
+    """
+
+    def __init__(self, name, initial=1, minimum=1, maximum=4, increase=1.0, decrease=0.5,
+                 initial_rate=1.0, min_rate=0.1, max_rate=10.0, rate_increase=0.1):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_increase = rate_increase
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.rate = float(min(max(initial_rate, min_rate), max_rate))
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.error_rate = 0.0
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, should_continue=None, poll=0.5):
+        """Espera un cupo libre y el turno de ritmo; retorna la hora de inicio.
+
+        Retorna None si should_continue() deja de ser verdadero mientras espera.
+        """
+        with self._cond:
+            while True:
+                if should_continue is not None and not should_continue():
+                    return None
+                now = time.monotonic()
+                if self.in_flight < int(self.limit) and now >= self._next_start:
+                    self.in_flight += 1
+                    self._next_start = now + 1.0 / self.rate
+                    return now
+                wait = poll
+                if self.in_flight < int(self.limit):
+                    wait = min(poll, self._next_start - now)
+                self._cond.wait(max(wait, 0.01))
+
+    def abandon(self):
+        """Libera el cupo sin ajustar los límites (solicitud cancelada)"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, started, success):
+        """Libera el cupo y ajusta los límites según el resultado"""
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self.in_flight -= 1
+            self.error_rate += EWMA_ALPHA * ((0.0 if success else 1.0) - self.error_rate)
+            if success:
+                self._on_success(elapsed)
+            else:
+                self._on_failure()
+            self._cond.notify_all()
+
+    def _on_success(self, elapsed):
+        self.latency = elapsed if self.latency is None else \
+            self.latency + EWMA_ALPHA * (elapsed - self.latency)
+        self.best_latency = elapsed if self.best_latency is None else \
+            min(self.best_latency, elapsed)
+        if self.latency > self.best_latency * LATENCY_TOLERANCE:
+            # El portal se está poniendo lento: mantener los límites actuales
+            return
+        self.limit = min(self.limit + self.increase / self.limit, self.maximum)
+        self.rate = min(self.rate + self.rate_increase, self.max_rate)
+
+    def _on_failure(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * self.decrease, self.minimum)
+        self.rate = max(self.rate * self.decrease, self.min_rate)
+        logging.warning(f"Control de tasa ({self.name}): límite reducido a "
+                        f"{int(self.limit)} en vuelo, {self.rate:.2f} solicitudes/s")
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'rate': round(self.rate, 2),
+                'latency': round(self.latency, 2) if self.latency is not None else None,
+                'error_rate': round(self.error_rate, 3)
+            }
+
+
+class RateController:
+    """Controlador compartido de búsquedas y descargas contra el portal DIAN"""
+
+    def __init__(self, search_sessions, fetch_concurrency):
+        self.search = AimdLimiter('search', initial=max(1, search_sessions // 2),
+                                  maximum=search_sessions,
+                                  initial_rate=1.0, max_rate=float(search_sessions),
+                                  rate_increase=0.2)
+        self.fetch = AimdLimiter('fetch', initial=min(2, fetch_concurrency),
+                                 maximum=fetch_concurrency, initial_rate=2.0,
+                                 max_rate=5.0 * fetch_concurrency)
+
+    def limits(self):
+        """Límites vigentes de cada etapa"""
+        return {'search': self.search.snapshot(), 'fetch': self.fetch.snapshot()}
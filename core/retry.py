@@ -0,0 +1,129 @@
+import os
+import time
+import heapq
+import random
+import logging
+import threading
+import requests
+from core.waits import WaitTimeout
+from core.pdf_fetcher import PdfDownloadError
+
+# Clases de falla de un CUFE
+CAPTCHA = 'captcha'
+NO_TOKEN = 'token'
+HTTP = 'http'
+TIMEOUT = 'timeout'
+UNKNOWN = 'error'
+
+# Política por clase: (intentos máximos, espera base en segundos, espera máxima)
+RETRY_POLICIES = {
+    CAPTCHA: (4, 5.0, 60.0),
+    NO_TOKEN: (3, 10.0, 120.0),
+    HTTP: (4, 5.0, 120.0),
+    TIMEOUT: (3, 15.0, 180.0),
+    UNKNOWN: (2, 10.0, 60.0)
+}
+
+DEAD_LETTER_FILE = "cufes_fallidos.xlsx"
+DEAD_LETTER_SHEET = "Fallidos"
+
+
+class DownloadFailure(Exception):
+    """Falla clasificada al procesar un CUFE"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+def classify_error(error):
+    """Determina la clase de falla de una excepción"""
+    if isinstance(error, DownloadFailure):
+        return error.kind
+    if isinstance(error, WaitTimeout):
+        return CAPTCHA if error.stage == 'captcha' else TIMEOUT
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, (PdfDownloadError, requests.HTTPError)):
+        return HTTP
+    if 'captcha' in str(error).lower():
+        return CAPTCHA
+    return UNKNOWN
+
+
+class RetryScheduler:
+    """Reprograma CUFEs fallidos con espera exponencial según la clase de falla.
+
+    Los CUFEs que agotan los intentos de su clase pasan a la lista de
+    fallidos definitivos (dead letters) con el motivo de la última falla.
+    """
+
+    def __init__(self, policies=None):
+        self.policies = dict(RETRY_POLICIES if policies is None else policies)
+        self.attempts = {}
+        self.last_failure = {}
+        self.dead_letters = []
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def schedule(self, cufe, kind, reason):
+        """Reprograma el CUFE; retorna False si ya agotó sus intentos"""
+        max_attempts, base_delay, max_delay = self.policies.get(kind, RETRY_POLICIES[UNKNOWN])
+        with self._lock:
+            attempts = self.attempts.get(cufe, 0) + 1
+            self.attempts[cufe] = attempts
+            self.last_failure[cufe] = (kind, str(reason))
+            if attempts >= max_attempts:
+                self.dead_letters.append({
+                    'CUFE/CUDE': cufe,
+                    'Clase': kind,
+                    'Motivo': str(reason),
+                    'Intentos': attempts
+                })
+                return False
+            delay = min(base_delay * 2 ** (attempts - 1), max_delay)
+            delay *= random.uniform(0.8, 1.2)
+            heapq.heappush(self._heap, (time.monotonic() + delay, cufe))
+        logging.warning(f"CUFE {cufe} reprogramado en {delay:.0f}s "
+                        f"(falla {kind}, intento {attempts}): {reason}")
+        return True
+
+    def pop_due(self):
+        """Retorna un CUFE cuya espera ya terminó, o None"""
+        with self._lock:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                return heapq.heappop(self._heap)[1]
+        return None
+
+    def pending(self):
+        with self._lock:
+            return len(self._heap)
+
+    def drain(self, reason):
+        """Da por fallidos todos los CUFEs reprogramados, venza o no su espera.
+
+        Cada uno pasa a los fallidos definitivos con la clase de su última
+        falla; retorna los CUFEs en orden de vencimiento.
+        """
+        with self._lock:
+            cufes = [heapq.heappop(self._heap)[1] for _ in range(len(self._heap))]
+            for cufe in cufes:
+                kind, last_reason = self.last_failure.get(cufe, (UNKNOWN, ""))
+                self.dead_letters.append({
+                    'CUFE/CUDE': cufe,
+                    'Clase': kind,
+                    'Motivo': f"{reason} (última falla: {last_reason})",
+                    'Intentos': self.attempts.get(cufe, 0)
+                })
+        return cufes
+
+
+def write_dead_letters(dead_letters, folder_path, filename=DEAD_LETTER_FILE):
+    """Guarda los CUFEs fallidos definitivos en una hoja de Excel"""
+    import pandas as pd
+
+    filepath = os.path.join(folder_path, filename)
+    df = pd.DataFrame(dead_letters, columns=['CUFE/CUDE', 'Clase', 'Motivo', 'Intentos'])
+    df.to_excel(filepath, sheet_name=DEAD_LETTER_SHEET, index=False)
+    logging.info(f"{len(dead_letters)} CUFEs fallidos guardados en {filepath}")
+    return filepath
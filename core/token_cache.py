@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import threading
+
+TOKEN_CACHE_FILE = "urls.txt"
+DEFAULT_TOKEN_TTL = 12 * 60 * 60  # segundos
+
+
+def parse_token(url):
+    """Extrae el token (Token= o token=) de una URL del portal"""
+    for key in ("Token=", "token="):
+        if key in url:
+            return url.split(key)[1].split("&")[0]
+    return None
+
+
+class TokenCache:
+    """Caché de tokens de descarga indexada por CUFE, respaldada por urls.txt.
+
+    Cada línea del archivo tiene la forma "cufe: url", opcionalmente seguida de
+    un tabulador y la marca de tiempo de captura. Las líneas antiguas sin marca
+    se consideran expiradas: no se sabe cuándo se capturó su token.
+    """
+
+    def __init__(self, path=TOKEN_CACHE_FILE, ttl=DEFAULT_TOKEN_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Lee el archivo de URLs capturadas; la última línea de cada CUFE gana"""
+        if not os.path.isfile(self.path):
+            return
+        entries = {}
+        with open(self.path, "r", encoding="utf-8", errors="ignore") as file:
+            for line in file:
+                cufe, sep, rest = line.strip().partition(": ")
+                if not sep:
+                    continue
+                url, _, stamp = rest.partition("\t")
+                token = parse_token(url)
+                if not token:
+                    continue
+                try:
+                    captured_at = float(stamp) if stamp else 0
+                except ValueError:
+                    captured_at = 0
+                entries[cufe] = (token, captured_at)
+        with self._lock:
+            self._entries = entries
+        logging.info(f"Caché de tokens: {len(entries)} tokens cargados de {self.path}")
+
+    def get(self, cufe):
+        """Retorna el token vigente del CUFE, o None si no hay o ya expiró"""
+        with self._lock:
+            entry = self._entries.get(cufe)
+            if entry is None:
+                return None
+            token, captured_at = entry
+            if time.time() - captured_at > self.ttl:
+                del self._entries[cufe]
+                return None
+            return token
+
+    def record(self, cufe, url):
+        """Registra la URL capturada para el CUFE y la agrega al archivo"""
+        now = time.time()
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(f"{cufe}: {url}\t{now:.0f}\n")
+            token = parse_token(url)
+            if token:
+                self._entries[cufe] = (token, now)
+
+    def invalidate(self, cufe):
+        """Descarta el token del CUFE, por ejemplo cuando el portal lo rechaza"""
+        with self._lock:
+            self._entries.pop(cufe, None)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Instancia de TokenCache compartida por todas las sesiones del proceso"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = TokenCache()
+        return _shared_cache
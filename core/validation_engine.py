@@ -0,0 +1,234 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from logging.handlers import QueueHandler, QueueListener
+
+# Tipo de documento del selector -> (procesador, hoja de processed_data)
+DOCUMENT_TYPES = {
+    'Factura de Venta': ('process_factura_venta', 'venta'),
+    'Factura de Compra': ('process_factura_compra', 'compra'),
+    'Nota Crédito': ('process_nota_credito', 'credito'),
+    'Nota Débito': ('process_nota_debito', 'debito'),
+    'Facturas de Compras Nuevos': ('process_facturas_compras_nuevos', 'compras_nuevos'),
+    'Facturas de Gastos': ('process_facturas_gastos', 'gastos')
+}
+
+# Procesos por defecto: todos los núcleos menos uno para la interfaz
+DEFAULT_VALIDATION_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+MAX_VALIDATION_WORKERS = max(1, os.cpu_count() or 1)
+# Archivos por envío a cada proceso: lotes grandes reducen el costo de IPC,
+# lotes chicos reparten mejor la carga y devuelven resultados antes
+MAX_CHUNK_SIZE = 16
+# Error de un PDF que no se pudo abrir o del que no se extrajo ninguna fila
+NOT_PROCESSED = 'No se pudo procesar'
+# Error de un PDF cuyo proceso de lectura terminó de forma abrupta (memoria,
+# falla de pdfminer); no se guarda en el caché porque puede ser pasajero
+PROCESS_CRASHED = 'No se pudo procesar (el proceso de lectura terminó inesperadamente)'
+
+
+def chunk_size(total, workers):
+    """Tamaño de lote para que cada proceso reciba unos cuatro lotes"""
+    return max(1, min(MAX_CHUNK_SIZE, total // (workers * 4)))
+
+
+def empty_result(filepath, doc_type, error=None):
+    return {
+        'file': os.path.basename(filepath),
+        'type': doc_type,
+        'rows': [],
+        'descuentos': [],
+        'inventario': [],
+        'error': error
+    }
+
+
+def validate_file(filepath, doc_type):
+    """Procesa un PDF y retorna sus filas por hoja o el error.
+
+    El resultado es un dict con file, type, rows, descuentos, inventario y
+    error; error es None si el archivo se procesó.
+    """
+    from core import pdf_processor
+
+    result = empty_result(filepath, doc_type)
+    processor_name, _ = DOCUMENT_TYPES[doc_type]
+    processor = getattr(pdf_processor, processor_name)
+    try:
+        # El PDF se abre una vez y todos los procesadores leen del mismo documento
+        with pdf_processor.ParsedDocument(filepath) as document:
+            if doc_type == 'Factura de Compra':
+                rows, descuentos = processor(document)
+                if rows:
+                    result['descuentos'] = descuentos or []
+                    result['inventario'] = pdf_processor.process_inventory(document) or []
+            else:
+                rows = processor(document)
+    except Exception as e:
+        # Como cuando cada procesador abría el PDF: el detalle va al log
+        logging.error(f"Error procesando {result['file']}: {str(e)}")
+        result['error'] = NOT_PROCESSED
+        return result
+
+    if rows:
+        result['rows'] = rows
+    else:
+        result['error'] = NOT_PROCESSED
+    return result
+
+
+def _validate_job(job):
+    return validate_file(*job)
+
+
+class _ForwardToRoot(logging.Handler):
+    """Reenvía al logging del proceso principal los registros de los procesos"""
+
+    def handle(self, record):
+        logging.getLogger(record.name).handle(record)
+        return True
+
+
+def _init_worker(log_queue, level):
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+
+class ValidationEngine:
+    """Procesa PDFs en un pool de procesos y entrega los resultados en orden.
+
+    results() es un generador de (índice, resultado) en el orden original de
+    los archivos, que avanza a medida que los procesos terminan cada lote.
+    Con un solo proceso se trabaja en el proceso actual, sin pool. Con un
+    ParseCache los archivos ya validados se toman del caché y solo los
+    nuevos o modificados se envían a los procesos.
+    """
+
+    def __init__(self, filepaths, doc_type, workers=DEFAULT_VALIDATION_WORKERS, chunksize=None,
+                 cache=None):
+        if doc_type not in DOCUMENT_TYPES:
+            raise ValueError(f"Tipo de documento no válido: {doc_type}")
+        self.filepaths = list(filepaths)
+        self.doc_type = doc_type
+        self.workers = max(1, min(int(workers), MAX_VALIDATION_WORKERS))
+        self.chunksize = chunksize
+        self.cache = cache
+        self.cached = 0
+        self.is_running = True
+        self._executor = None
+
+    def results(self):
+        # El caché se consulta en este proceso: los procesos del pool solo parsean
+        keys = [None] * len(self.filepaths)
+        cached = {}
+        if self.cache is not None:
+            for index, filepath in enumerate(self.filepaths):
+                if not self.is_running:
+                    return
+                keys[index] = self.cache.key(filepath)
+                stored = keys[index] and self.cache.get(keys[index], self.doc_type)
+                if stored:
+                    cached[index] = dict(stored, file=os.path.basename(filepath),
+                                         type=self.doc_type)
+            self.cached = len(cached)
+            logging.info(f"{self.cached} de {len(self.filepaths)} archivos tomados del caché")
+
+        pending = [filepath for index, filepath in enumerate(self.filepaths)
+                   if index not in cached]
+        parsed = self._parse(pending)
+        try:
+            for index in range(len(self.filepaths)):
+                result = cached.get(index)
+                if result is None:
+                    result = next(parsed, None)
+                    if result is None:
+                        return
+                    if keys[index] and result['error'] in (None, NOT_PROCESSED):
+                        # Las caídas del proceso no se guardan: pueden ser pasajeras
+                        self.cache.put(keys[index], self.doc_type, result)
+                if not self.is_running:
+                    return
+                yield index, result
+        finally:
+            parsed.close()
+
+    def _parse(self, filepaths):
+        """Genera en orden los resultados de procesar filepaths"""
+        if not filepaths:
+            return
+        jobs = [(filepath, self.doc_type) for filepath in filepaths]
+        workers = min(self.workers, len(jobs))
+        chunksize = self.chunksize or chunk_size(len(jobs), workers)
+        if workers == 1:
+            for job in jobs:
+                if not self.is_running:
+                    return
+                yield validate_file(*job)
+            return
+
+        # spawn evita heredar el estado de Qt y los hilos del proceso principal
+        context = multiprocessing.get_context("spawn")
+        log_queue = context.Queue()
+        listener = QueueListener(log_queue, _ForwardToRoot())
+        listener.start()
+        logging.info(f"Validando {len(jobs)} archivos con {workers} procesos "
+                     f"(lotes de {chunksize})")
+        done = 0
+        isolate = False
+        try:
+            while done < len(jobs) and self.is_running:
+                # Tras una caída, el siguiente archivo se prueba solo para saber
+                # si es el que la provoca; después se vuelve al pool completo
+                pending = jobs[done:done + 1] if isolate else jobs[done:]
+                try:
+                    for result in self._map(context, log_queue, pending,
+                                            1 if isolate else workers, chunksize):
+                        done += 1
+                        isolate = False
+                        yield result
+                except BrokenProcessPool:
+                    if not self.is_running:
+                        return
+                    if isolate:
+                        filepath, doc_type = jobs[done]
+                        logging.error(f"El proceso de validación terminó inesperadamente "
+                                      f"procesando {os.path.basename(filepath)}")
+                        done += 1
+                        isolate = False
+                        yield empty_result(filepath, doc_type, PROCESS_CRASHED)
+                    else:
+                        logging.warning("Un proceso de validación terminó inesperadamente, "
+                                        "reiniciando el pool")
+                        isolate = True
+        finally:
+            listener.stop()
+
+    def _map(self, context, log_queue, jobs, workers, chunksize):
+        """Resultados en orden de jobs en un pool nuevo; lanza BrokenProcessPool si cae"""
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker,
+            initargs=(log_queue, logging.getLogger().getEffectiveLevel()))
+        try:
+            for result in self._executor.map(_validate_job, jobs, chunksize=chunksize):
+                if not self.is_running:
+                    return
+                yield result
+        except CancelledError:
+            if self.is_running:
+                raise
+        finally:
+            self._executor.shutdown(wait=self.is_running, cancel_futures=True)
+            self._executor = None
+
+    def stop(self):
+        """Deja de entregar resultados y descarta los lotes pendientes.
+
+        Se puede llamar desde otro hilo; los lotes que ya están en proceso
+        terminan en segundo plano.
+        """
+        self.is_running = False
+        executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
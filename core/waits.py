@@ -0,0 +1,143 @@
+import time
+import logging
+import threading
+
+# Intervalo de sondeo de las condiciones (segundos)
+POLL_INTERVAL = 0.2
+
+# Timeout inicial, mínimo y máximo (segundos) de cada etapa de process_cufe
+STAGE_TIMEOUTS = {
+    'open': (15.0, 3.0, 60.0),
+    'captcha': (15.0, 3.0, 60.0),
+    'type': (5.0, 1.0, 15.0),
+    'search': (20.0, 3.0, 60.0),
+    'back': (10.0, 2.0, 30.0)
+}
+DEFAULT_STAGE_TIMEOUT = (15.0, 3.0, 60.0)
+MAX_BACKOFF = 8.0
+
+# Respuesta oculta que deja el widget de CAPTCHA una vez resuelto
+CAPTCHA_RESPONSE = "[name='cf-turnstile-response'], [name='g-recaptcha-response']"
+
+
+class WaitTimeout(TimeoutError):
+    """La condición de una etapa no se cumplió dentro de su timeout"""
+
+    def __init__(self, stage, timeout):
+        super().__init__(f"Tiempo de espera agotado en la etapa '{stage}' ({timeout:.1f}s)")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class AdaptiveTimeouts:
+    """Aprende la latencia típica de cada etapa y ajusta su timeout.
+
+    Usa el mismo estimador que el RTO de TCP: promedio suavizado más cuatro
+    veces la desviación suavizada, limitado al rango de la etapa.
+    """
+
+    def __init__(self, defaults=None, alpha=0.125, beta=0.25):
+        self.defaults = dict(STAGE_TIMEOUTS if defaults is None else defaults)
+        self.alpha = alpha
+        self.beta = beta
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, stage):
+        return self.defaults.get(stage, DEFAULT_STAGE_TIMEOUT)
+
+    def timeout(self, stage):
+        """Timeout actual de la etapa"""
+        initial, minimum, maximum = self._limits(stage)
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                return initial
+            value = stats['mean'] + 4 * stats['dev']
+            return min(max(value * stats['backoff'], minimum), maximum)
+
+    def record(self, stage, elapsed):
+        """Registra la latencia observada de una etapa que terminó a tiempo"""
+        with self._lock:
+            stats = self._stats.get(stage)
+            if stats is None:
+                self._stats[stage] = {'mean': elapsed, 'dev': elapsed / 2, 'backoff': 1.0}
+                return
+            error = elapsed - stats['mean']
+            stats['mean'] += self.alpha * error
+            stats['dev'] += self.beta * (abs(error) - stats['dev'])
+            stats['backoff'] = 1.0
+
+    def backoff(self, stage):
+        """Duplica el timeout de la etapa tras un vencimiento"""
+        initial = self._limits(stage)[0]
+        with self._lock:
+            stats = self._stats.setdefault(
+                stage, {'mean': initial / 2, 'dev': initial / 8, 'backoff': 1.0})
+            stats['backoff'] = min(stats['backoff'] * 2, MAX_BACKOFF)
+
+    def snapshot(self):
+        """Timeouts vigentes de todas las etapas conocidas"""
+        stages = set(self.defaults) | set(self._stats)
+        return {stage: round(self.timeout(stage), 2) for stage in sorted(stages)}
+
+
+# Instancia compartida por todas las sesiones de descarga
+adaptive_timeouts = AdaptiveTimeouts()
+
+
+def wait_until(condition, stage, timeouts=None, poll=POLL_INTERVAL, cancel=None):
+    """Espera a que condition() retorne un valor verdadero y lo retorna.
+
+    Las excepciones de la condición cuentan como "todavía no". Lanza
+    WaitTimeout si el timeout adaptativo de la etapa se agota y Cancelled si
+    se activa el CancelToken cancel.
+    """
+    timeouts = timeouts or adaptive_timeouts
+    timeout = timeouts.timeout(stage)
+    start = time.monotonic()
+    deadline = start + timeout
+
+    while True:
+        if cancel is not None:
+            cancel.check()
+        try:
+            result = condition()
+        except Exception:
+            result = None
+        if result:
+            timeouts.record(stage, time.monotonic() - start)
+            return result
+        if time.monotonic() >= deadline:
+            timeouts.backoff(stage)
+            logging.warning(f"Etapa '{stage}' sin respuesta tras {timeout:.1f}s")
+            raise WaitTimeout(stage, timeout)
+        if cancel is not None:
+            cancel.wait(poll)
+        else:
+            time.sleep(poll)
+
+
+def captcha_shown(sb):
+    """Verdadero si la página muestra el widget de CAPTCHA"""
+    return sb.is_element_present(CAPTCHA_RESPONSE)
+
+
+def captcha_solved(sb):
+    """Verdadero cuando el widget de CAPTCHA está en la página y ya entregó su respuesta.
+
+    Un widget que aún no se dibuja no cuenta como resuelto; quien quiera
+    omitir el CAPTCHA cuando la página no lo pide debe consultar captcha_shown.
+    """
+    if not captcha_shown(sb):
+        return False
+    return bool(sb.execute_script(
+        "return Array.from(document.querySelectorAll(arguments[0]))"
+        ".some(function (e) { return e.value; });",
+        CAPTCHA_RESPONSE
+    ))
+
+
+def token_in_url(url):
+    """Verdadero si la URL ya trae el token de descarga"""
+    return "token=" in (url or "").lower()
@@ -1,20 +1,26 @@
 import sys
 from PyQt5.QtWidgets import QApplication
 from ui.main_window import MainWindow
+import os
 import logging
+import multiprocessing
 import sys
 from PyQt5.QtWidgets import QApplication
 from ui.validator_tab import ValidatorTab
+from core.log_pipeline import (start_queue_logging, stop_queue_logging, rotating_file_handler,
+                               LOG_FORMAT)
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s: %(message)s',
-        handlers=[
-            logging.FileHandler('dian_downloader.log'),
-            logging.StreamHandler()
-        ]
-    )
+    # DIAN_LOG_FORMAT=json escribe el archivo como JSON por línea;
+    # DIAN_LOG_LEVEL=DEBUG activa los volcados de texto de los PDFs
+    json_lines = os.environ.get('DIAN_LOG_FORMAT', '').lower() == 'json'
+    level = getattr(logging, os.environ.get('DIAN_LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    file_handler = rotating_file_handler(
+        'dian_downloader.jsonl' if json_lines else 'dian_downloader.log', json_lines)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    # Los hilos de descarga solo encolan registros; un hilo aparte los escribe
+    start_queue_logging([file_handler, console_handler], level)
 
 def main():
     # Configurar logging
@@ -49,7 +55,11 @@ def main():
     window.show()
     
     # Ejecutar la aplicación
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    stop_queue_logging()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
+    # Necesario para los procesos de captura en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
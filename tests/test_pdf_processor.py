@@ -0,0 +1,103 @@
+import re
+import pytest
+from core import pdf_processor
+from core.pdf_processor import (ParsedDocument, FieldExtractor, TOTALES, TOTAL_LABELS,
+                                NOTA_CREDITO, FACTURA_REFERENCIA, parse_colombian_number)
+
+
+class TextDocument(ParsedDocument):
+    """ParsedDocument armado con texto y filas de tabla, sin abrir un PDF"""
+
+    def __init__(self, pages, rows=(), path="fixture.pdf"):
+        self.path = path
+        self.page_count = len(pages)
+        self._texts = dict(enumerate(pages))
+        self._tables = {}
+        self._rows = [list(row) for row in rows]
+
+    def close(self):
+        pass
+
+
+ENCABEZADO = (
+    "Razón Social: ACME S.A.S. Nombre Comercial: ACME\n"
+    "Nit del Emisor: 900123456 País: Colombia\n"
+    "Fecha de Emisión: 05/01/2025 Medio de Pago: Efectivo\n"
+    "Número de Factura: {numero} Forma de pago: Contado\n"
+)
+TOTALES_TEXTO = "Datos Totales\nIVA $ 1.900,00\nRete IVA $ 285,00\n"
+ITEMS = [["1", "A1", "Producto", "UND", "1", "10.000,00", "", "", "", "19"]]
+
+FACTURA_VENTA_TEXTO = "Factura Electrónica de Venta\n" + ENCABEZADO.format(numero="FE-9876")
+NOTA_CREDITO_TEXTO = (
+    "Nota Crédito de la Factura Electrónica\n" + ENCABEZADO.format(numero="NC-15")
+    + "Referencias\nFactura Electrónica FE-9876 02/01/2025\n"
+)
+
+
+def regex_amounts(text):
+    """Montos con una regex por etiqueta, como los extraía el código original"""
+    values = {}
+    for name, label in TOTAL_LABELS.items():
+        match = re.search(re.escape(label) + r'\s*[\$\s]*([0-9.,]+)', text, re.IGNORECASE)
+        if match:
+            values[name] = parse_colombian_number(match.group(1).strip())
+    return values
+
+
+def test_nota_sin_marcador_no_genera_filas():
+    factura = TextDocument([FACTURA_VENTA_TEXTO + TOTALES_TEXTO], ITEMS)
+    nota_credito = TextDocument([NOTA_CREDITO_TEXTO + TOTALES_TEXTO], ITEMS)
+
+    assert pdf_processor.process_nota_credito(factura) == []
+    assert pdf_processor.process_nota_debito(factura) == []
+    assert pdf_processor.process_nota_debito(nota_credito) == []
+
+
+def test_nota_credito_con_marcador_usa_columnas_de_venta():
+    nota = TextDocument([NOTA_CREDITO_TEXTO + TOTALES_TEXTO], ITEMS)
+
+    rows = pdf_processor.process_nota_credito(nota)
+    venta = pdf_processor.process_factura_venta(nota)
+
+    assert len(rows) == 1
+    assert rows[0] == dict(venta[0], B="Nota Crédito")
+    assert rows[0]["J"] == "10000.00"
+    assert rows[0]["M"] == rows[0]["O"] == "NC-15"
+    assert rows[0]["P"] == "1900.0"
+
+
+@pytest.mark.parametrize("text", [
+    TOTALES_TEXTO,
+    # La etiqueta IVA aparece primero dentro de Rete IVA
+    "Datos Totales\nRete IVA $ 285,00\nIVA $ 1.900,00\n",
+    # La primera aparición de IVA no va seguida de un monto
+    "Datos Totales\nIVA incluido\nIVA $ 1.900,00\nRete IVA 285,00\n",
+    # Un carácter que cambia de largo en minúsculas obliga a usar la regex
+    "Datos Totales İ\nRete IVA $ 285,00\nIVA $ 1.900,00\n",
+])
+def test_montos_como_una_regex_por_etiqueta(text):
+    assert TOTALES.extract(text) == regex_amounts(text)
+
+
+def test_montos_con_etiqueta_contenida_en_otra():
+    values = TOTALES.extract(TOTALES_TEXTO)
+
+    assert values['Total IVA'] == 1900.0
+    assert values['Rete IVA'] == 285.0
+    assert 'Rete ICA' not in values
+
+
+def test_factura_referencia():
+    header = NOTA_CREDITO.header.extract(NOTA_CREDITO_TEXTO)
+
+    assert header['factura_referencia'] == "FE-9876"
+    assert header['numero_factura'] == "NC-15"
+
+
+def test_factura_referencia_ausente():
+    extractor = FieldExtractor(patterns={'factura_referencia': FACTURA_REFERENCIA})
+    # El marcador de la nota no cuenta: la referencia debe empezar la línea
+    text = "Nota Crédito de la Factura Electrónica\nSin referencias\n"
+
+    assert extractor.extract(text) == {'factura_referencia': ""}
@@ -0,0 +1,14 @@
+from core.retry import RetryScheduler, CAPTCHA, HTTP
+
+
+def test_drain_da_por_fallidos_los_reintentos_sin_vencer():
+    retries = RetryScheduler({CAPTCHA: (3, 60.0, 60.0), HTTP: (3, 60.0, 60.0)})
+    retries.schedule("cufe-1", CAPTCHA, "captcha sin resolver")
+    retries.schedule("cufe-2", HTTP, "HTTP 503")
+
+    assert retries.pop_due() is None
+    assert sorted(retries.drain("Sin sesiones")) == ["cufe-1", "cufe-2"]
+    assert retries.pending() == 0
+    assert sorted((d['CUFE/CUDE'], d['Clase'], d['Intentos']) for d in retries.dead_letters) == [
+        ("cufe-1", CAPTCHA, 1), ("cufe-2", HTTP, 1)]
+    assert all(d['Motivo'].startswith("Sin sesiones") for d in retries.dead_letters)
@@ -0,0 +1,25 @@
+from core.waits import captcha_shown, captcha_solved
+
+
+class Page:
+    """Navegador falso con el valor del widget de CAPTCHA (None si no está)"""
+
+    def __init__(self, response=None):
+        self.response = response
+
+    def is_element_present(self, selector):
+        return self.response is not None
+
+    def execute_script(self, script, selector):
+        return self.response
+
+
+def test_captcha_sin_widget_no_cuenta_como_resuelto():
+    assert not captcha_shown(Page())
+    assert not captcha_solved(Page())
+
+
+def test_captcha_resuelto_solo_con_respuesta():
+    assert captcha_shown(Page(""))
+    assert not captcha_solved(Page(""))
+    assert captcha_solved(Page("respuesta"))
@@ -1,13 +1,12 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QFileDialog, QLabel, QProgressDialog, QTextEdit,
-                             QMessageBox)
+                             QFileDialog, QLabel, QProgressDialog,
+                             QMessageBox, QSpinBox, QApplication)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-import pandas as pd
 import os
-import logging
-import time
-import requests
-from seleniumbase import SB
+from core.download_engine import DownloadEngine, DEFAULT_WORKERS, MAX_WORKERS
+from core.cufe_input import read_cufes
+from core.browser_pool import BrowserPool
+from ui.log_viewer import LogViewer
 
 class DownloadWorker(QThread):
     progress = pyqtSignal(int)
@@ -19,88 +18,50 @@ class DownloadWorker(QThread):
         self.cufes = []
         self.folder_path = ""
         self.excel_path = ""
+        self.workers = DEFAULT_WORKERS
+        self.browser_pool = None
+        self.engine = None
+        self.summary = None
         self.is_running = True
 
-    def process_cufe(self, sb, cufe):
-        try:
-            url = "https://catalogo-vpfe.dian.gov.co/User/SearchDocument"
-            logging.info(f"Procesando CUFE: {cufe}")
-            
-            sb.uc_open_with_reconnect(url, 4)
-            time.sleep(3)
-
-            logging.info("Resolviendo CAPTCHA...")
-            sb.uc_gui_click_captcha()
-            time.sleep(4)
-
-            input_field = "input[placeholder='Ingrese el código CUFE o UUID']"
-            sb.type(input_field, cufe)
-            time.sleep(2)
-
-            sb.click("button:contains('Buscar')")
-            time.sleep(5)
-
-            current_url = sb.get_current_url()
-            logging.info(f"URL capturada: {current_url}")
-
-            token = None
-            if "Token=" in current_url:
-                token = current_url.split("Token=")[1].split("&")[0]
-            elif "token=" in current_url:
-                token = current_url.split("token=")[1].split("&")[0]
-
-            if token:
-                download_url = f"https://catalogo-vpfe.dian.gov.co/Document/DownloadPDF?trackId={cufe}&token={token}"
-                response = requests.get(download_url)
-                
-                if response.status_code == 200:
-                    excel_name = os.path.splitext(os.path.basename(self.excel_path))[0]
-                    filename = f"{excel_name}_{cufe}.pdf"
-                    filepath = os.path.join(self.folder_path, filename)
-                    with open(filepath, "wb") as file:
-                        file.write(response.content)
-                    logging.info(f"Archivo PDF descargado: {filename}")
-                    
-                    with open(os.path.join(self.folder_path, "links_descarga.txt"), "a") as file:
-                        file.write(f"{cufe}: {download_url}\n")
-                    return True
-                else:
-                    logging.error(f"Error al descargar el archivo PDF para el CUFE {cufe}")
-                    return False
-            else:
-                logging.error(f"No se encontró el token en la URL para el CUFE {cufe}")
-                return False
-
-        except Exception as e:
-            logging.error(f"Error procesando CUFE {cufe}: {str(e)}")
-            return False
-
     def run(self):
         try:
-            with SB(uc=True, test=True, incognito=True, locale_code="en") as sb:
-                total = len(self.cufes)
-                for i, cufe in enumerate(self.cufes):
-                    if not self.is_running:
-                        break
-                        
-                    success = self.process_cufe(sb, cufe)
-                    if not success:
-                        self.error.emit(cufe, "Error procesando CUFE")
-                    
-                    self.progress.emit(int((i + 1) * 100 / total))
+            self.engine = DownloadEngine(
+                self.cufes,
+                self.folder_path,
+                self.excel_path,
+                workers=self.workers,
+                on_progress=self.progress.emit,
+                on_error=self.error.emit,
+                browser_pool=self.browser_pool,
+                # Sin pool precalentado el motor crea uno: también aislado en procesos
+                isolate_browsers=True
+            )
+            self.browser_pool = None
+            if self.is_running:
+                self.summary = self.engine.run()
+            elif self.engine.browser_pool:
+                self.engine.browser_pool.close()
 
         except Exception as e:
             self.error.emit("Sistema", str(e))
         finally:
             self.finished.emit()
 
-    def set_data(self, cufes, folder_path, excel_path):
+    def set_data(self, cufes, folder_path, excel_path, workers=DEFAULT_WORKERS,
+                 browser_pool=None):
         self.cufes = cufes
         self.folder_path = folder_path
         self.excel_path = excel_path
+        self.workers = workers
+        self.browser_pool = browser_pool
+        self.summary = None
+        self.is_running = True
 
     def stop(self):
         self.is_running = False
+        if self.engine:
+            self.engine.stop()
 
 class DownloadTab(QWidget):
     def __init__(self):
@@ -112,6 +73,10 @@ class DownloadTab(QWidget):
         self.worker.finished.connect(self.download_finished)
         self.excel_path = None
         self.folder_path = None
+        self.cufes = []
+        self.last_progress = None
+        self.browser_pool = None
+        QApplication.instance().aboutToQuit.connect(self.close_browser_pool)
 
     def setup_ui(self):
         layout = QVBoxLayout(self)
@@ -196,10 +161,9 @@ class DownloadTab(QWidget):
         log_header = QLabel("Log de Proceso")
         log_header.setStyleSheet("font-weight: bold; font-size: 14px;")
         
-        self.log_viewer = QTextEdit()
-        self.log_viewer.setReadOnly(True)
+        self.log_viewer = LogViewer()
         self.log_viewer.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #f8f9fa;
                 border: 1px solid #dee2e6;
                 border-radius: 4px;
@@ -257,7 +221,15 @@ class DownloadTab(QWidget):
             }
         """)
         
+        workers_label = QLabel("Sesiones simultáneas:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, MAX_WORKERS)
+        self.workers_spin.setValue(DEFAULT_WORKERS)
+        self.workers_spin.valueChanged.connect(self.resize_browser_pool)
+        
         control_layout.addStretch()
+        control_layout.addWidget(workers_label)
+        control_layout.addWidget(self.workers_spin)
         control_layout.addWidget(self.start_btn)
         control_layout.addWidget(self.stop_btn)
         control_layout.addStretch()
@@ -276,15 +248,37 @@ class DownloadTab(QWidget):
         )
         
         if file_path:
+            # Los navegadores arrancan mientras se lee el Excel
+            self.prewarm_browsers()
             try:
-                df = pd.read_excel(file_path, sheet_name='Token')
+                batch = read_cufes(file_path)
                 self.excel_path = file_path
+                self.cufes = batch.cufes
                 self.excel_label.setText(f'Archivo: {os.path.basename(file_path)}')
-                self.log_viewer.append(f"Excel cargado: {len(df)} registros encontrados")
+                for line in batch.describe():
+                    self.log_viewer.append(line)
                 self.update_start_button()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error al leer el archivo Excel: {str(e)}")
 
+    def prewarm_browsers(self):
+        """Lanza en segundo plano los navegadores de la próxima descarga"""
+        if self.browser_pool is None:
+            # Cada navegador corre en su propio proceso: un Chrome colgado o
+            # caído no congela la interfaz y el watchdog lo reemplaza
+            self.browser_pool = BrowserPool(self.workers_spin.value(), isolate=True).start()
+        else:
+            self.browser_pool.resize(self.workers_spin.value())
+
+    def resize_browser_pool(self, value):
+        if self.browser_pool is not None:
+            self.browser_pool.resize(value)
+
+    def close_browser_pool(self):
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
+
     def select_folder(self):
         folder_path = QFileDialog.getExistingDirectory(
             self,
@@ -298,25 +292,30 @@ class DownloadTab(QWidget):
             self.update_start_button()
 
     def update_start_button(self):
-        self.start_btn.setEnabled(bool(self.excel_path and self.folder_path))
+        self.start_btn.setEnabled(bool(self.excel_path and self.folder_path and self.cufes))
 
     def start_download(self):
         try:
-            df = pd.read_excel(self.excel_path, sheet_name='Token')
-            cufes = df['CUFE/CUDE'].dropna().tolist()
+            cufes = list(self.cufes)
             
             if not cufes:
                 QMessageBox.warning(self, "Advertencia", "No hay CUFEs para procesar")
                 return
             
-            self.worker.set_data(cufes, self.folder_path, self.excel_path)
+            self.worker.set_data(cufes, self.folder_path, self.excel_path,
+                                 workers=self.workers_spin.value(),
+                                 browser_pool=self.browser_pool)
+            # El motor de descarga se queda con el pool y lo cierra al terminar
+            self.browser_pool = None
             
             self.start_btn.setEnabled(False)
             self.stop_btn.setEnabled(True)
             self.excel_btn.setEnabled(False)
             self.folder_btn.setEnabled(False)
+            self.workers_spin.setEnabled(False)
             
             self.log_viewer.clear()
+            self.last_progress = None
             self.log_viewer.append("Iniciando proceso de descarga...")
             
             self.worker.start()
@@ -331,6 +330,10 @@ class DownloadTab(QWidget):
         self.log_viewer.append("Deteniendo proceso...")
 
     def update_progress(self, value):
+        # Un CUFE por señal: solo se registra cuando cambia el porcentaje
+        if value == self.last_progress:
+            return
+        self.last_progress = value
         self.log_viewer.append(f"Progreso: {value}%")
 
     def log_error(self, cufe, error):
@@ -341,5 +344,11 @@ class DownloadTab(QWidget):
         self.stop_btn.setEnabled(False)
         self.excel_btn.setEnabled(True)
         self.folder_btn.setEnabled(True)
+        self.workers_spin.setEnabled(True)
+        summary = self.worker.summary
+        if summary and summary.get('dead_letter_path'):
+            self.log_viewer.append(
+                f"{len(summary['dead_letters'])} CUFEs fallidos guardados en "
+                f"{summary['dead_letter_path']}")
         self.log_viewer.append("Proceso de descarga finalizado")
         QMessageBox.information(self, "Completado", "Proceso de descarga finalizado")
\ No newline at end of file
@@ -0,0 +1,62 @@
+import queue
+import logging
+from PyQt5.QtWidgets import QPlainTextEdit
+from PyQt5.QtCore import QTimer
+
+# Líneas que conserva el visor; las más antiguas se descartan
+MAX_LOG_LINES = 5000
+# Frecuencia de refresco y máximo de líneas que se pintan por refresco
+FLUSH_INTERVAL_MS = 200
+MAX_LINES_PER_FLUSH = 500
+
+
+class LogViewer(QPlainTextEdit):
+    """Visor de log de solo lectura con tope de líneas.
+
+    append() se puede llamar desde cualquier hilo: las líneas se acumulan en
+    una cola y un QTimer del hilo de la interfaz las pinta en bloque.
+    """
+
+    def __init__(self, parent=None, max_lines=MAX_LOG_LINES):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self._pending = queue.SimpleQueue()
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(FLUSH_INTERVAL_MS)
+
+    def append(self, text):
+        self._pending.put(text)
+
+    def clear(self):
+        while not self._pending.empty():
+            self._pending.get_nowait()
+        super().clear()
+
+    def flush(self):
+        lines = []
+        while len(lines) < MAX_LINES_PER_FLUSH and not self._pending.empty():
+            lines.append(self._pending.get_nowait())
+        if not lines:
+            return
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.appendPlainText("\n".join(lines))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+
+class LogViewerHandler(logging.Handler):
+    """Handler de logging que escribe en un LogViewer"""
+
+    def __init__(self, viewer, level=logging.INFO):
+        super().__init__(level)
+        self.viewer = viewer
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    def emit(self, record):
+        try:
+            self.viewer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
@@ -2,25 +2,90 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                             QFileDialog, QLabel, QProgressDialog, QTableWidget,
                             QTableWidgetItem, QMessageBox, QTabWidget, QComboBox,
                             QHeaderView)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import pandas as pd
 import os
+import time
+import logging
 from PyPDF2 import PdfReader
-from core.pdf_processor import (process_factura_venta, process_factura_compra,
-                             process_nota_credito, process_nota_debito,
-                             process_facturas_compras_nuevos, process_facturas_gastos,
-                             process_inventory, get_document_type, COLUMN_HEADERS)
+from core.pdf_processor import get_document_type, COLUMN_HEADERS
+from core.validation_engine import (ValidationEngine, DOCUMENT_TYPES,
+                                    DEFAULT_VALIDATION_WORKERS, MAX_VALIDATION_WORKERS)
+from core.parse_cache import ParseCache
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
                              QFileDialog, QLabel, QProgressDialog, QTableWidget,
                              QTableWidgetItem, QMessageBox, QTabWidget, QComboBox,
-                             QHeaderView, QApplication)  #
+                             QHeaderView, QApplication, QSpinBox, QProgressBar, QCheckBox)  #
+# Los resultados se envían a la interfaz en lotes de este tamaño o cada este intervalo
+RESULT_BATCH_SIZE = 25
+RESULT_BATCH_INTERVAL = 0.3
+
+
+class ValidationWorker(QThread):
+    """Procesa los PDFs fuera del hilo de la interfaz y entrega los resultados por lotes"""
+    results = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+    def __init__(self, filepaths, doc_type, workers, use_cache=True, parent=None):
+        super().__init__(parent)
+        self.filepaths = filepaths
+        self.doc_type = doc_type
+        self.workers = workers
+        self.use_cache = use_cache
+        self.engine = None
+        self.is_running = True
+
+    def open_cache(self):
+        if not self.use_cache:
+            return None
+        try:
+            return ParseCache()
+        except Exception as e:
+            logging.warning(f"No se pudo abrir el caché de validación: {str(e)}")
+            return None
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        cache = self.open_cache()
+        try:
+            self.engine = ValidationEngine(self.filepaths, self.doc_type, workers=self.workers,
+                                           cache=cache)
+            if not self.is_running:
+                return
+            for index, result in self.engine.results():
+                batch.append((index, result))
+                if (len(batch) >= RESULT_BATCH_SIZE
+                        or time.monotonic() - last_emit >= RESULT_BATCH_INTERVAL):
+                    self.results.emit(batch)
+                    batch = []
+                    last_emit = time.monotonic()
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            # Lo ya procesado se entrega aunque se haya cancelado o fallado
+            if batch:
+                self.results.emit(batch)
+            if cache is not None:
+                cache.close()
+
+    def stop(self):
+        self.is_running = False
+        if self.engine:
+            self.engine.stop()
+
+
 class ValidatorTab(QWidget):
     def __init__(self):
         super().__init__()
         self.setup_ui()
         self.files_to_process = []
         self.current_type = None
+        self.worker = None
+        self.run_stats = None
+        self.cancelling = False
         self.setup_data_containers()
+        QApplication.instance().aboutToQuit.connect(self.stop_worker)
 
     def setup_data_containers(self):
         """Inicializa los contenedores de datos"""
@@ -107,6 +172,22 @@ class ValidatorTab(QWidget):
         doc_type_layout.addWidget(doc_type_label)
         doc_type_layout.addWidget(self.doc_type_combo)
 
+        # Procesos simultáneos para leer los PDFs
+        workers_label = QLabel("Procesos:")
+        workers_label.setStyleSheet("font-size: 14px;")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, MAX_VALIDATION_WORKERS)
+        self.workers_spin.setValue(DEFAULT_VALIDATION_WORKERS)
+        self.workers_spin.setToolTip("Cantidad de procesos que leen PDFs en paralelo")
+        doc_type_layout.addWidget(workers_label)
+        doc_type_layout.addWidget(self.workers_spin)
+
+        self.cache_check = QCheckBox("Reusar resultados anteriores")
+        self.cache_check.setChecked(True)
+        self.cache_check.setToolTip("Los PDFs sin cambios desde la última validación "
+                                    "se toman del caché en lugar de leerse de nuevo")
+        doc_type_layout.addWidget(self.cache_check)
+
         # Botón de procesar
         self.process_btn = QPushButton('3. Procesar Documentos')
         self.process_btn.clicked.connect(self.process_files)
@@ -189,6 +270,15 @@ class ValidatorTab(QWidget):
             }
         """)
 
+        # Progreso de la validación en curso
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.cancel_btn = QPushButton('Cancelar')
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setVisible(False)
+
+        bottom_layout.addWidget(self.progress_bar)
+        bottom_layout.addWidget(self.cancel_btn)
         bottom_layout.addStretch()
         bottom_layout.addWidget(self.export_btn)
 
@@ -255,146 +345,161 @@ class ValidatorTab(QWidget):
 
         # Obtener el tipo de documento seleccionado
         doc_type = self.doc_type_combo.currentText()
-        processor_map = {
-            'Factura de Venta': process_factura_venta,
-            'Factura de Compra': process_factura_compra,
-            'Nota Crédito': process_nota_credito,
-            'Nota Débito': process_nota_debito,
-            'Facturas de Compras Nuevos': process_facturas_compras_nuevos,
-            'Facturas de Gastos': process_facturas_gastos
-        }
-
-        processor = processor_map.get(doc_type)
-        if not processor:
+        if doc_type not in DOCUMENT_TYPES:
             QMessageBox.warning(self, "Error", "Tipo de documento no válido")
             return
 
-        # Configurar barra de progreso
-        progress = QProgressDialog("Procesando documentos...", "Cancelar", 0, len(self.files_to_process), self)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setWindowTitle("Procesando")
-        progress.setMinimumDuration(0)
-        progress.setMinimumWidth(400)
-
-        processed = 0
-        errors = 0
-
-        # Mapeo de tipos de documento a claves de processed_data
-        type_to_key = {
-            'Factura de Venta': 'venta',
-            'Factura de Compra': 'compra',
-            'Nota Crédito': 'credito',
-            'Nota Débito': 'debito',
-            'Facturas de Compras Nuevos': 'compras_nuevos',
-            'Facturas de Gastos': 'gastos'
-        }
+        # Los PDFs se procesan en segundo plano; las tablas se llenan a medida
+        # que llegan los lotes de resultados, en el orden de selección
+        self.run_stats = {'total': len(self.files_to_process), 'done': 0,
+                          'processed': 0, 'errors': 0}
+        self.cancelling = False
+        self.set_running(True)
+        self.worker = ValidationWorker(list(self.files_to_process), doc_type,
+                                       self.workers_spin.value(),
+                                       self.cache_check.isChecked(), self)
+        self.worker.results.connect(self.on_results)
+        self.worker.error.connect(self.on_worker_error)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.start()
 
-        # Procesar cada archivo
-        for i, filepath in enumerate(self.files_to_process):
-            if progress.wasCanceled():
-                break
+    def set_running(self, running):
+        """Alterna los controles entre validación en curso y reposo"""
+        self.select_btn.setEnabled(not running)
+        self.process_btn.setEnabled(not running and bool(self.files_to_process))
+        self.doc_type_combo.setEnabled(not running)
+        self.workers_spin.setEnabled(not running)
+        self.cache_check.setEnabled(not running)
+        self.progress_bar.setVisible(running)
+        self.cancel_btn.setVisible(running)
+        self.cancel_btn.setEnabled(running)
+        if running:
+            self.progress_bar.setRange(0, self.run_stats['total'])
+            self.progress_bar.setValue(0)
+        else:
+            self.export_btn.setEnabled(any(self.processed_data.values()))
 
-            progress.setValue(i)
-            filename = os.path.basename(filepath)
-            progress.setLabelText(f"Procesando {i+1} de {len(self.files_to_process)}: {filename}")
+    def on_results(self, batch):
+        """Guarda un lote de resultados y agrega sus filas a las tablas"""
+        if self.sender() is not self.worker or self.run_stats is None:
+            # Lote de una corrida anterior
+            return
+        new_rows = {}
+        for _, result in batch:
+            if self.store_result(result, new_rows):
+                self.run_stats['processed'] += 1
+            else:
+                self.run_stats['errors'] += 1
+            self.run_stats['done'] += 1
 
-            try:
-                # Procesamiento basado en el tipo de documento
-                if doc_type == 'Factura de Compra':
-                    rows, descuentos = processor(filepath)
-                    inventory_items = process_inventory(filepath)
-                    
-                    if rows:
-                        self.processed_data['compra'].extend(rows)
-                        if descuentos:
-                            self.processed_data['descuentos'].extend(descuentos)
-                        if inventory_items:
-                            self.processed_data['inventario'].extend(inventory_items)
-                        processed += 1
-                    else:
-                        self.processed_data['errores'].append({
-                            'Archivo': filename,
-                            'Tipo': doc_type,
-                            'Error': 'No se pudo procesar'
-                        })
-                        errors += 1
-                else:
-                    # Para todos los demás tipos de documento
-                    rows = processor(filepath)
-                    if rows:
-                        # Usar el mapeo de tipos a claves
-                        key = type_to_key.get(doc_type)
-                        if key:
-                            self.processed_data[key].extend(rows)
-                            processed += 1
-                        else:
-                            self.processed_data['errores'].append({
-                                'Archivo': filename,
-                                'Tipo': doc_type,
-                                'Error': 'Tipo de documento no reconocido'
-                            })
-                            errors += 1
-                    else:
-                        self.processed_data['errores'].append({
-                            'Archivo': filename,
-                            'Tipo': doc_type,
-                            'Error': 'No se pudo procesar'
-                        })
-                        errors += 1
+        for key, rows in new_rows.items():
+            self.append_table_rows(key, rows)
+        self.progress_bar.setValue(self.run_stats['done'])
+        self.files_label.setText(f"Procesados {self.run_stats['done']} de "
+                                 f"{self.run_stats['total']}: {batch[-1][1]['file']}")
+
+    def on_worker_error(self, message):
+        QMessageBox.critical(self, "Error", f"Error en la validación: {message}")
+
+    def cancel_processing(self):
+        """Detiene la validación; lo ya procesado se conserva en las tablas.
+
+        El resumen se muestra cuando el hilo termina, después de recibir los
+        resultados que tenía pendientes de enviar.
+        """
+        if self.worker is None:
+            self.finish_run(cancelled=True)
+            return
+        self.cancelling = True
+        self.cancel_btn.setEnabled(False)
+        self.files_label.setText("Cancelando...")
+        self.worker.stop()
+
+    def on_worker_finished(self):
+        worker = self.sender()
+        if worker is not None:
+            worker.deleteLater()
+        if worker is self.worker:
+            self.worker = None
+            self.finish_run(cancelled=self.cancelling)
+
+    def stop_worker(self):
+        """Detiene la validación en curso al cerrar la aplicación"""
+        if self.worker:
+            self.worker.stop()
+            self.worker.wait(5000)
+
+    def finish_run(self, cancelled):
+        stats = self.run_stats
+        if stats is None:
+            return
+        self.run_stats = None
+        self.set_running(False)
+        self.files_label.setText(f'Archivos seleccionados: {len(self.files_to_process)}')
 
-            except Exception as e:
-                self.processed_data['errores'].append({
-                    'Archivo': filename,
-                    'Tipo': doc_type,
-                    'Error': str(e)
-                })
-                errors += 1
-                import traceback
-                traceback.print_exc()  # Imprimir el traceback completo
-
-            # Actualizar progreso después de cada archivo
-            QApplication.processEvents()
-
-        progress.setValue(len(self.files_to_process))
-        
-        # Actualizar tablas y habilitar exportación
-        self.update_tables()
-        self.export_btn.setEnabled(True)
-        
         # Mostrar resumen
-        QMessageBox.information(self, "Completado", 
-            f"Proceso finalizado:\n"
-            f"Total archivos: {len(self.files_to_process)}\n"
-            f"Procesados exitosamente: {processed}\n"
-            f"Errores: {errors}"
+        QMessageBox.information(self, "Cancelado" if cancelled else "Completado",
+            f"Proceso {'cancelado' if cancelled else 'finalizado'}:\n"
+            f"Total archivos: {stats['total']}\n"
+            f"Revisados: {stats['done']}\n"
+            f"Procesados exitosamente: {stats['processed']}\n"
+            f"Errores: {stats['errors']}"
         )
 
+    def store_result(self, result, added=None):
+        """Agrega a processed_data las filas de un archivo; retorna False si falló.
+
+        Si se entrega added, acumula ahí las filas nuevas de cada hoja.
+        """
+        def add(key, rows):
+            self.processed_data[key].extend(rows)
+            if added is not None and rows:
+                added.setdefault(key, []).extend(rows)
+
+        if result['error']:
+            add('errores', [{
+                'Archivo': result['file'],
+                'Tipo': result['type'],
+                'Error': result['error']
+            }])
+            return False
+
+        _, key = DOCUMENT_TYPES[result['type']]
+        add(key, result['rows'])
+        add('descuentos', result['descuentos'])
+        add('inventario', result['inventario'])
+        return True
+
     def update_tables(self):
         """Actualiza las tablas con los datos procesados"""
         for data_type, data in self.processed_data.items():
             if data:
-                table = self.tables[data_type]
-                
-                # Usar los headers definidos en el procesador
-                headers = list(COLUMN_HEADERS.values())
-                
-                # Configurar tabla
-                table.setColumnCount(len(headers))
-                table.setHorizontalHeaderLabels(headers)
-                table.setRowCount(len(data))
-                
-                for i, row in enumerate(data):
-                    # Convertir el diccionario de datos a un formato que coincida con los headers
-                    for j, (letra, nombre) in enumerate(COLUMN_HEADERS.items()):
-                        if letra == 'T':  # Para la columna ICUI
-                            value = str(row.get('ICUI', row.get('T', '0.0')))
-                        else:
-                            value = str(row.get(letra, '0.0'))
-                        item = QTableWidgetItem(value)
-                        table.setItem(i, j, item)
-                
-                table.resizeColumnsToContents()
-        
+                self.tables[data_type].setRowCount(0)
+                self.append_table_rows(data_type, data)
+
+    def append_table_rows(self, data_type, rows):
+        """Agrega filas al final de una tabla sin repintar las que ya tiene"""
+        table = self.tables[data_type]
+        # Usar los headers definidos en el procesador
+        headers = list(COLUMN_HEADERS.values())
+        if table.columnCount() != len(headers):
+            table.setColumnCount(len(headers))
+            table.setHorizontalHeaderLabels(headers)
+
+        table.setUpdatesEnabled(False)
+        start = table.rowCount()
+        table.setRowCount(start + len(rows))
+        for i, row in enumerate(rows, start):
+            # Convertir el diccionario de datos a un formato que coincida con los headers
+            for j, (letra, nombre) in enumerate(COLUMN_HEADERS.items()):
+                if letra == 'T':  # Para la columna ICUI
+                    value = str(row.get('ICUI', row.get('T', '0.0')))
+                else:
+                    value = str(row.get(letra, '0.0'))
+                table.setItem(i, j, QTableWidgetItem(value))
+        table.setUpdatesEnabled(True)
+        table.resizeColumnsToContents()
+
     def export_to_excel(self):
         """Exporta los datos procesados a Excel"""
         if not any(self.processed_data.values()):